@@ -8,24 +8,17 @@
 
 import socket
 import json
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
 
 from geodetic import *
 from airports import airports
 
-_host = '127.0.0.1'
-_port = 5454
-
 _retry_timeout = 60
 _retry_period = 2
 
 
-def sim_host_set(h, p=5454):
-    global _host
-    _host = h
-    _port = p
-
-
 class Instruments:
 
     def __init__(self):
@@ -35,6 +28,18 @@ class Instruments:
         self.heading = 0  # heading of plane
         self.pitch = 0  # pitch of plane
         self.roll = 0  # roll of plane
+        self.time = 0  # time.time() when the instruments were read
+
+    def set(self, values, t=None):
+        # values: values read for the properties in instrument_props
+        ias, alt, alt_agl, lat, lon, heading, pitch, roll = values
+        self.loc = Location(lat, lon, alt)
+        self.alt_agl = alt_agl
+        self.ias = ias
+        self.heading = heading
+        self.pitch = pitch
+        self.roll = roll
+        self.time = time.time() if t is None else t
 
     def __repr__(self):
         return f'Instruments(lat={self.loc.lat:.7f}, lon={self.loc.lon:.7f}), alt={self.loc.alt:.1f}, alt_agl={self.alt_agl:.1f}, ias={self.ias:.1f}, heading={self.heading:.1f}, pitch={self.pitch:.1f}, roll={self.roll:.1f}))'
@@ -43,6 +48,11 @@ class Instruments:
 class Controls:
 
     def __init__(self):
+        self.sent = [None] * len(control_setprops)  # values last sent
+        self.refresh_time = 0  # time when all the controls were last sent
+        self.reset()
+
+    def reset(self):
         self.elevator = 0
         self.aileron = 0
         self.rudder = 0
@@ -52,158 +62,597 @@ class Controls:
         self.brake = 0
         self.parking = 0
 
+    def changes(self):
+
+        # Returns the Nasal code that sets the controls that have changed
+        # since they were last sent, and marks them as sent. All the
+        # controls are sent every controls_refresh_period seconds in
+        # case they were changed in the simulator (e.g. with the mouse).
+
+        now = time.time()
+        full = now - self.refresh_time >= controls_refresh_period
+        if full:
+            self.refresh_time = now
+        sent = self.sent
+        code = ''
+        for i, (field, setprop) in enumerate(control_setprops):
+            value = getattr(self, field)
+            if full or value != sent[i]:
+                code += setprop + nasal_value(value) + ');'
+                sent[i] = value
+        return code
+
+    def forget(self):
+
+        # The values in the simulator are unknown (the changes could
+        # not be sent or the simulator was reset), send them all next
+        # time.
+
+        self.refresh_time = 0
+
     def __repr__(self):
         return f'Controls(elevator={self.elevator:.2f}, aileron={self.aileron:.2f}, rudder={self.rudder:.2f}, flaps={self.flaps:.2f}, throttle={self.throttle:.2f}, mixture={self.mixture:.2f}, brake={self.brake:.1f}, parking={self.parking})'
 
 
+# Batched access to the properties of the simulator. A batch of
+# property writes and reads is sent as a single Nasal script which
+# does all the writes and then answers a single line with all the
+# values read, tagged with a sequence number:
+#
+#    [seq,value1,value2,...]\r\n
+#
+# A whole control step (send the controls and read the instruments)
+# thus costs a single round-trip. Lines that do not carry the
+# sequence number of the batch (for example the late answer of an
+# earlier command) are skipped.
+
+def nasal_value(value):
+    if isinstance(value, str):
+        return json.dumps(value)
+    if isinstance(value, bool):
+        return str(int(value))
+    return str(value)
+
+
+def nasal_batch(seq, reads=(), writes=(), code=''):
+
+    # reads: list of property names
+    # writes: list of (property name, value) pairs
+    # code: Nasal statements to run after the writes
+
+    code = ''.join('setprop("' + prop + '",' + nasal_value(value) + ');'
+                   for prop, value in writes) + code
+    code += 'sprintf("[%d' + ',%f' * len(reads) + ']\\r\\n",' + str(seq)
+    for prop in reads:
+        code += ',getprop("' + prop + '")'
+    return 'nasal\r\n' + code + ')\r\n##EOF##\r\n'
+
+
+instrument_props = [
+    'instrumentation/airspeed-indicator/indicated-speed-kt',
+    'position/altitude-ft',
+    'position/altitude-agl-ft',
+    'position/latitude-deg',
+    'position/longitude-deg',
+    'orientation/model/heading-deg',
+    'orientation/model/pitch-deg',
+    'orientation/model/roll-deg',
+]
+
+control_props = [
+    ('throttle', '/controls/engines/current-engine/throttle'),
+    ('mixture', '/controls/engines/engine/mixture'),
+    ('elevator', '/controls/flight/elevator'),
+    ('aileron', '/controls/flight/aileron'),
+    ('rudder', '/controls/flight/rudder'),
+    ('flaps', '/controls/flight/flaps'),
+    ('brake', '/controls/flight/brake'),
+    ('parking', '/sim/model/c172p/brake-parking'),
+]
+
+
+def control_writes(c):
+    return [(prop, getattr(c, field)) for field, prop in control_props]
+
+
+# Only the controls that have changed are sent on each step (see
+# Controls.changes), with the start of their setprop prepared once.
+# All of them are sent again every controls_refresh_period seconds.
+
+control_setprops = [(field, 'setprop("' + prop + '",') for field, prop in control_props]
+
+controls_refresh_period = 1.0
+
+
+shutdown_writes = [('/engines/active-engine/kill-engine', 1),
+                   ('/controls/engines/active-engine/throttle', 0)]
+
+# The altitude is read in a batch after the one that resets JSBSim,
+# once the reset has been processed (read in the same batch it would
+# still be the altitude before the reset).
+
+reset_pause_writes = [('/fdm/jsbsim/simulation/pause', 1),
+                      ('/fdm/jsbsim/simulation/reset', 1)]
+
+reset_reads = ['/fdm/jsbsim/position/h-sl-ft']
+
+
+# The resets wait for the simulator to reach a state (engine stopped,
+# aircraft settled on the ground) by reading it every wait_period
+# seconds until it has been reached on wait_stable reads in a row.
+
+wait_period = 0.05
+wait_stable = 3
+
+engine_reads = ['/engines/active-engine/running',
+                '/engines/active-engine/rpm']
+
+
+def engine_stopped(values):
+    running, rpm = values
+    return running == 0 and rpm < 1
+
+
+settle_reads = ['/fdm/jsbsim/simulation/pause',
+                '/gear/gear[0]/wow',
+                '/gear/gear[1]/wow',
+                '/gear/gear[2]/wow',
+                '/velocities/speed-down-fps',
+                '/velocities/groundspeed-kt']
+
+
+def settled(values):
+    pause, wow0, wow1, wow2, speed_down, groundspeed = values
+    return (pause == 0 and wow0 == 1 and wow1 == 1 and wow2 == 1 and
+            abs(speed_down) < 0.5 and groundspeed < 1)
+
+
+def reset_writes(current_alt, c):
+
+    # Writes that put the aircraft back 2 meters above the ground with
+    # a repaired engine and the controls c, and restart the simulation.
+
+    return ([('/fdm/jsbsim/position/h-sl-ft', current_alt + 2 * 3.28084),
+             ('/fdm/jsbsim/settings/damage', 0),
+             ('/engines/active-engine/running', 0),
+             ('/engines/active-engine/kill-engine', 0),
+             ('/engines/active-engine/killed', 0),
+             ('/engines/active-engine/crashed', 0),
+             ('/engines/active-engine/crash-engine', 0)] +
+            control_writes(c) +
+            [('/fdm/jsbsim/simulation/pause', 0)])
+
+
+# Streaming of the instruments. FlightGear can send the instruments at
+# a fixed rate over UDP with its "generic" protocol described in
+# instruments.xml. That file must be copied to the Protocol directory
+# of FlightGear and enabled with this additional setting (50 times per
+# second to port 5502, which is forwarded by the chisel tunnel):
+#
+#    --generic=socket,out,50,127.0.0.1,5502,udp,instruments
+#
+# Once sim_stream_start() is called, a background thread receives the
+# samples and recv_instruments returns the latest one without waiting
+# for the simulator. It falls back to telnet if no sample is more
+# recent than _stream_max_age seconds.
+
+_stream_max_age = 0.5
+
+
+class InstrumentStream:
+
+    def __init__(self, port=5502, host=''):
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.bind((host, port))
+        self.sock.settimeout(0.5)
+        self.sample = None  # (time, values) of the latest sample
+        self.samples = 0
+        self.running = True
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def run(self):
+        while self.running:
+            try:
+                data = self.sock.recv(2048)
+            except TimeoutError:
+                continue
+            except OSError:
+                break
+            try:
+                values = [float(x) for x in data.split(b'\n')[0].split(b',')]
+            except ValueError:
+                continue
+            if len(values) == len(instrument_props):
+                self.sample = (time.time(), values)  # replaced atomically
+                self.samples += 1
+
+    def latest(self):
+        sample = self.sample
+        if sample is None or time.time() - sample[0] > _stream_max_age:
+            return None
+        return sample
+
+    def close(self):
+        self.running = False
+        self.sock.close()
+        self.thread.join()
+
+
+# A connection to a simulator. It has its own instruments and controls
+# so that a process can control several aircraft, each on its own
+# simulator. The module level functions below use a default connection
+# for programs that control a single aircraft.
+
+class FGConnection:
+
+    def __init__(self, host='127.0.0.1', port=5454, instruments=None, controls=None):
+        self.host = host
+        self.port = port
+        self.instruments = Instruments() if instruments is None else instruments
+        self.controls = Controls() if controls is None else controls
+        self.sock = None
+        self.seq = 0
+        self.stream = None
+        self.recorder = None
+        self.lock = threading.RLock()  # socket and controls, a reset can run in the background
+
+        # The answers of the simulator are read through a buffer so
+        # that an answer split over several packets, or several answers
+        # received in a single packet, are split into lines correctly
+        # and nothing is lost between two reads.
+        self.buffer = bytearray()
+
+    def address(self):
+        return self.host + ':' + str(self.port)
+
+    def connect(self):
+        print('=== Connecting to FlightGear on ' + self.address(), end='', flush=True)
+        i = 0
+        while True:
+            try:
+                sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+                sock.settimeout(_retry_period / 2)
+                sock.connect((self.host, self.port))
+            except BaseException as exc:
+                if not (type(exc) is OSError or type(exc) is TimeoutError or type(exc) is ConnectionRefusedError):
+                    raise exc
+                sock = None
+            if sock is not None:
+                break
+            if i == _retry_timeout:
+                print('=== Could not connect to FlightGear on ' + self.address())
+                raise BaseException('Could not connect to FlightGear')
+            i += 1
+            print('.', end='', flush=True)
+            time.sleep(_retry_period / 2)
+        print(': connected!')
+        self.sock = sock
+        time.sleep(0.25)
+        self.send('data')  # turn on data mode (to avoid prompts)
+        time.sleep(0.25)
+        self.buffer.clear()
+
+    def close(self):
+        self.stream_stop()
+        self.record_stop()
+        if self.sock is not None:
+            self.sock.close()
+            self.sock = None
+
+    def send(self, cmd):
+        # print(cmd)
+        self.sock.sendall(cmd.encode() + b'\r\n')
+
+    def recv(self):
+        if self.buffer:
+            data = bytes(self.buffer)
+            self.buffer.clear()
+            return data
+        return self.sock.recv(1024)
+
+    def recv_line(self):
+
+        # Returns the next line answered by the simulator, without the
+        # line terminator. Raises TimeoutError if the simulator does
+        # not answer in time (the partial line is kept for the next
+        # read).
+
+        while True:
+            end = self.buffer.find(b'\n')
+            if end >= 0:
+                line = self.buffer[:end].decode(errors='replace').strip()
+                del self.buffer[:end+1]
+                return line
+            data = self.sock.recv(4096)
+            if not data:
+                raise ConnectionError('FlightGear closed the connection')
+            self.buffer.extend(data)
+
+    def batch(self, reads=(), writes=(), code=''):
+
+        # Does the property writes, runs the Nasal code, then does the
+        # property reads, in a single round-trip and returns the list
+        # of the values read.
+
+        with self.lock:
+            self.seq += 1
+            self.send(nasal_batch(self.seq, reads, writes, code))
+            tag = '[' + str(self.seq)
+            while True:
+                line = self.recv_line()
+                start = line.find('[')  # skip a prompt
+                if start < 0:
+                    continue
+                line = line[start:]
+                if line == tag + ']':
+                    return []
+                if line.startswith(tag + ','):
+                    return json.loads(line)[1:]
+
+    def wait_until(self, reads, condition, timeout, what):
+
+        # Reads the properties until condition(values) is true on
+        # wait_stable reads in a row, and returns the values. Raises
+        # TimeoutError if that takes more than timeout seconds.
+
+        end = time.time() + timeout
+        stable = 0
+        while True:
+            values = self.batch(reads)
+            stable = stable + 1 if condition(values) else 0
+            if stable >= wait_stable:
+                return values
+            if time.time() > end:
+                raise TimeoutError(what + ' after ' + format(timeout, '.1f') + 's on ' + self.address())
+            time.sleep(wait_period)
+
+    def stream_start(self, port=5502):
+        self.stream_stop()
+        self.stream = InstrumentStream(port)
+
+    def stream_stop(self):
+        if self.stream is not None:
+            self.stream.close()
+            self.stream = None
+
+    def stream_sample(self):
+        return None if self.stream is None else self.stream.latest()
+
+    def record_start(self, path):
+
+        # Records the instruments and the controls in a binary file
+        # (see recorder.py) each time the instruments are read or the
+        # controls are sent.
+
+        from recorder import Recorder
+
+        self.record_stop()
+        self.recorder = Recorder(path)
+
+    def record_stop(self):
+        if self.recorder is not None:
+            self.recorder.close()
+            self.recorder = None
+
+    def recv_instruments(self):
+        sample = self.stream_sample()
+        if sample is not None:
+            self.instruments.set(sample[1], sample[0])
+        else:
+            while True:
+                try:
+                    self.instruments.set(self.batch(instrument_props))
+                    break
+                except (TimeoutError, ValueError):
+                    pass  # ask again, the late answer will be skipped
+        self.record()
+
+    def record(self, t=None):
+        if self.recorder is not None:
+            with self.lock:
+                self.recorder.record(self.instruments, self.controls, t)
+
+    def send_changes(self, reads=()):
+
+        # Sends the controls that have changed and does the reads. The
+        # lock keeps a reset running in the background from changing
+        # the controls at the same time.
+
+        with self.lock:
+            code = self.controls.changes()
+            if code == '' and not reads:
+                return []
+            try:
+                return self.batch(reads, code=code)
+            except BaseException:
+                self.controls.forget()
+                raise
+
+    def send_controls(self):
+        self.send_changes()
+        self.record(time.time())
+
+    def control_step(self):
+
+        # Sends the controls and reads the instruments in a single
+        # round-trip. This is what a control loop should call on every
+        # tick.
+
+        sample = self.stream_sample()
+        if sample is not None:
+            self.send_changes()
+            self.instruments.set(sample[1], sample[0])
+        else:
+            self.instruments.set(self.send_changes(instrument_props))
+        self.record()
+
+    def autostart_c172p(self):
+        self.batch(code='c172p.autostart();')
+
+    def shutdown_engine(self, timeout=10):
+        with self.lock:
+            self.batch(writes=shutdown_writes)
+            self.controls.throttle = 0
+
+        try:
+            self.wait_until(engine_reads, engine_stopped, timeout, 'engine not stopped')
+        finally:
+            self.batch(writes=[('/engines/active-engine/kill-engine', 0)])
+
+    def reset_aircraft(self, airport: str, runway: str, timeout=20, background=False):
+
+        # Puts the aircraft back on the ground with the engine stopped
+        # and returns when it has settled. With background=True it
+        # returns at once a concurrent.futures.Future of the reset.
+
+        if background:
+            return _background.submit(self.reset_aircraft, airport, runway, timeout)
+
+        ap = airports.get(airport, None)
+        if ap is None:
+            print(f'Airport {airport} not found')
+            return
+
+        if ap.runways.get(runway, None) is None:
+            print(f'Runway {runway} not found at {airport}')
+            return
+
+        end = time.time() + timeout
+
+        self.shutdown_engine(max(0, end - time.time()))
+
+        self.batch(writes=reset_pause_writes)
+        current_alt, = self.batch(reset_reads)
+        with self.lock:
+            self.controls.reset()
+            self.batch(writes=reset_writes(current_alt, self.controls))
+            self.controls.forget()
+        self.wait_until(settle_reads, settled, max(0, end - time.time()),
+                        'aircraft not settled on the ground')
+        self.batch(writes=[('/fdm/jsbsim/settings/damage', 0)])
+
+
+_background = ThreadPoolExecutor()
+
+
+# A set of connections to several simulators, for example to fly a
+# squadron of aircraft. The connections are opened in parallel and
+# run() calls a method on all the connections in parallel:
+#
+#    pool = FGPool(['127.0.0.1:5454', '127.0.0.1:5455'])
+#    pool.connect()
+#    while True:
+#        for conn in pool:
+#            ...  # set conn.controls from conn.instruments
+#        pool.run('control_step')
+
+class FGPool:
+
+    def __init__(self, addresses):
+
+        # addresses: list of 'host:port' strings or (host, port) pairs
+
+        self.connections = []
+        for address in addresses:
+            if isinstance(address, str):
+                host, _, port = address.partition(':')
+                address = (host, int(port or 5454))
+            self.connections.append(FGConnection(*address))
+        self.executor = ThreadPoolExecutor(max_workers=max(1, len(self.connections)))
+
+    def __len__(self):
+        return len(self.connections)
+
+    def __getitem__(self, i):
+        return self.connections[i]
+
+    def __iter__(self):
+        return iter(self.connections)
+
+    def run(self, method, *args):
+
+        # Calls the method on all the connections in parallel and
+        # returns the list of the results.
+
+        futures = [self.executor.submit(getattr(conn, method), *args)
+                   for conn in self.connections]
+        return [f.result() for f in futures]
+
+    def connect(self):
+        self.run('connect')
+
+    def close(self):
+        self.run('close')
+        self.executor.shutdown()
+
+
 instruments = Instruments()
 controls = Controls()
 
+_connection = FGConnection(instruments=instruments, controls=controls)
+
+
+def sim_host_set(h, p=5454):
+    _connection.host = h
+    _connection.port = p
+
 
 def sim_connect():
-    global sock
-    print('=== Connecting to FlightGear on ' + _host + ':' + str(_port), end='', flush=True)
-    i = 0
-    while True:
-        try:
-            sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            sock.settimeout(_retry_period / 2)
-            sock.connect((_host, _port))
-        except BaseException as exc:
-            if not (type(exc) is OSError or type(exc) is TimeoutError or type(exc) is ConnectionRefusedError):
-                raise exc
-            sock = None
-        if sock is not None:
-            break
-        if i == _retry_timeout:
-            print('=== Could not connect to FlightGear on ' + _host + ':' + str(_port))
-            raise BaseException('Could not connect to FlightGear')
-        i += 1
-        print('.', end='', flush=True)
-        time.sleep(_retry_period / 2)
-    print(': connected!')
-    time.sleep(0.25)
-    send('data')  # turn on data mode (to avoid prompts)
-    time.sleep(0.25)
+    _connection.connect()
+
+
+def sim_stream_start(port=5502):
+    _connection.stream_start(port)
+
+
+def sim_stream_stop():
+    _connection.stream_stop()
+
+
+def sim_record_start(path):
+    _connection.record_start(path)
+
+
+def sim_record_stop():
+    _connection.record_stop()
 
 
 def send(cmd):
-    # print(cmd)
-    sock.sendall(cmd.encode() + b'\r\n')
+    _connection.send(cmd)
 
 
 def recv():
-    return sock.recv(1024)
+    return _connection.recv()
+
+
+def recv_line():
+    return _connection.recv_line()
+
+
+def batch(reads=(), writes=(), code=''):
+    return _connection.batch(reads, writes, code)
 
 
 def recv_instruments():
-    while True:
-        try:
-            send('nasal\r\nsprintf("[%f,%f,%f,%f,%f,%f,%f,%f]\\r\\n",' +
-                 'getprop("instrumentation/airspeed-indicator/indicated-speed-kt"),' +
-                 'getprop("position/altitude-ft"),' +
-                 'getprop("position/altitude-agl-ft"),' +
-                 'getprop("position/latitude-deg"),' +
-                 'getprop("position/longitude-deg"),' +
-                 'getprop("orientation/model/heading-deg"),' +
-                 'getprop("orientation/model/pitch-deg"),' +
-                 'getprop("orientation/model/roll-deg"))' +
-                 '\r\n##EOF##\r\n')
-            response = recv()
-            ias, alt, alt_agl, lat, lon, heading, pitch, roll = tuple(json.loads(response.decode()))
-            instruments.loc = Location(lat, lon, alt)
-            instruments.alt_agl = alt_agl
-            instruments.ias = ias
-            instruments.heading = heading
-            instruments.pitch = pitch
-            instruments.roll = roll
-            return
-        except BaseException:
-            time.sleep(0.1)
+    _connection.recv_instruments()
 
 
 def send_controls():
-    send('nasal\r\n' +
-         'setprop("/controls/engines/current-engine/throttle","' + str(controls.throttle) + '");' +
-         'setprop("/controls/engines/engine/mixture","' + str(controls.mixture) + '");' +
-         'setprop("/controls/flight/elevator","' + str(controls.elevator) + '");' +
-         'setprop("/controls/flight/aileron","' + str(controls.aileron) + '");' +
-         'setprop("/controls/flight/rudder","' + str(controls.rudder) + '");' +
-         'setprop("/controls/flight/flaps","' + str(controls.flaps) + '");' +
-         'setprop("/controls/flight/brake","' + str(controls.brake) + '");' +
-         'setprop("/sim/model/c172p/brake-parking","' + str(controls.parking) + '")' +
-         '\r\n##EOF##\r\n')
-    recv()
+    _connection.send_controls()
 
 
-def autostart_c172p():
-    send('nasal\r\nc172p.autostart()\r\n##EOF##\r\n')
-
+def control_step():
+    _connection.control_step()
 
-def shutdown_engine():
-    send('nasal\r\n' +
-         'setprop("/engines/active-engine/kill-engine", 1);' +
-         'setprop("/controls/engines/active-engine/throttle", 0);' +
-         '\r\n##EOF##\r\n')
-    recv()
 
-    controls.throttle = 0
+def autostart_c172p():
+    _connection.autostart_c172p()
 
-    seconds_without_engine = 0
-    current_time = time.time()
-    while True:
-        try:
-            send('nasal\r\nsprintf("%d\\r\\n", getprop("/engines/active-engine/running"));\r\n##EOF##\r\n')
-            if recv().decode() == '0\r\n':
-                seconds_without_engine += time.time() - current_time
 
-            if seconds_without_engine > 2:
-                break
+def shutdown_engine(timeout=10):
+    _connection.shutdown_engine(timeout)
 
-            time.sleep(0.1)
-        except BaseException:
-            return
 
-    send('nasal\r\nsetprop("/engines/active-engine/kill-engine", 0);\r\n##EOF##\r\n')
-    recv()
-
-
-def reset_aircraft(airport: str, runway: str):
-    global controls
-    airport = airports.get(airport, None)
-    if airport is None:
-        print(f'Airport {airport} not found')
-        return
-
-    runway = airport.runways.get(runway, None)
-    if runway is None:
-        print(f'Runway {runway} not found at {airport}')
-        return
-
-    shutdown_engine()
-
-    send('nasal\r\n' +
-         'setprop("/fdm/jsbsim/simulation/pause", 1);' +
-         'setprop("/fdm/jsbsim/simulation/reset", 1);'
-         '\r\n##EOF##\r\n')
-    recv()
-    send('nasal\r\nsprintf("%f\\r\\n", getprop("/fdm/jsbsim/position/h-sl-ft"));\r\n##EOF##\r\n')
-    current_alt = float(recv().decode())
-    send(f'nasal\r\nsetprop("/fdm/jsbsim/position/h-sl-ft", {current_alt + 2 * 3.28084});\r\n##EOF##\r\n')
-    recv()
-    send('nasal\r\n' +
-         'setprop("/fdm/jsbsim/settings/damage", 0);' +
-         'setprop("/engines/active-engine/running", 0);' +
-         'setprop("/engines/active-engine/kill-engine", 0);' +
-         'setprop("/engines/active-engine/killed", 0);' +
-         'setprop("/engines/active-engine/crashed", 0);' +
-         'setprop("/engines/active-engine/crash-engine"", 0);'
-            '\r\n##EOF##\r\n')
-    recv()
-    controls = Controls()
-    send_controls()
-    send('nasal\r\nsetprop("/fdm/jsbsim/simulation/pause", 0);\r\n##EOF##\r\n')
-    recv()
-    time.sleep(3)
-    send('nasal\r\nsetprop("/fdm/jsbsim/settings/damage", 0);\r\n##EOF##\r\n')
-    recv()
+def reset_aircraft(airport: str, runway: str, timeout=20, background=False):
+    return _connection.reset_aircraft(airport, runway, timeout, background)
@@ -0,0 +1,191 @@
+# File: FG_async.py
+
+# An asyncio interface to the FlightGear simulator. It offers the
+# operations of FG.py but on an object per simulator, so that a single
+# process can drive several simulators, and with several commands in
+# flight at once on each simulator: every command is a batch tagged
+# with a sequence number (see FG.batch) and the answers are dispatched
+# to the waiting commands by a reader task.
+#
+#    async def main():
+#        sims = [FGAsync('127.0.0.1', 5454 + i) for i in range(4)]
+#        await asyncio.gather(*(sim.connect() for sim in sims))
+#        while True:
+#            await asyncio.gather(*(sim.control_step() for sim in sims))
+#            ...
+#
+#    asyncio.run(main())
+
+import asyncio
+import json
+import time
+
+from FG import (Instruments, Controls, nasal_batch, instrument_props,
+                _retry_timeout, _retry_period,
+                shutdown_writes, reset_reads, reset_pause_writes, reset_writes,
+                engine_reads, engine_stopped, settle_reads, settled,
+                wait_period, wait_stable)
+from airports import airports
+
+_answer_timeout = 5
+
+
+class FGAsync:
+
+    def __init__(self, host='127.0.0.1', port=5454):
+        self.host = host
+        self.port = port
+        self.instruments = Instruments()
+        self.controls = Controls()
+        self.reader = None
+        self.writer = None
+        self.reader_task = None
+        self.seq = 0
+        self.pending = {}  # futures of the batches waiting for their answer
+
+    async def connect(self):
+        for i in range(_retry_timeout + 1):
+            try:
+                self.reader, self.writer = await asyncio.wait_for(
+                    asyncio.open_connection(self.host, self.port),
+                    _retry_period / 2)
+                break
+            except (OSError, asyncio.TimeoutError):
+                if i == _retry_timeout:
+                    raise ConnectionError('Could not connect to FlightGear on ' +
+                                          self.host + ':' + str(self.port))
+                await asyncio.sleep(_retry_period / 2)
+        self.send('data')  # turn on data mode (to avoid prompts)
+        await asyncio.sleep(0.25)
+        self.reader_task = asyncio.create_task(self.read_answers())
+
+    async def close(self):
+        if self.reader_task is not None:
+            self.reader_task.cancel()
+        if self.writer is not None:
+            self.writer.close()
+            await self.writer.wait_closed()
+
+    def send(self, cmd):
+        self.writer.write(cmd.encode() + b'\r\n')
+
+    async def read_answers(self):
+        try:
+            while True:
+                line = await self.reader.readline()
+                if not line:
+                    break
+                line = line.decode(errors='replace').strip()
+                start = line.find('[')  # skip a prompt
+                if start < 0:
+                    continue
+                try:
+                    answer = json.loads(line[start:])
+                except ValueError:
+                    continue
+                if not isinstance(answer, list) or not answer or type(answer[0]) is not int:
+                    continue  # not the answer of a batch
+                future = self.pending.pop(answer[0], None)
+                if future is not None and not future.done():
+                    future.set_result(answer[1:])
+        finally:
+            for future in self.pending.values():
+                if not future.done():
+                    future.set_exception(ConnectionError('FlightGear closed the connection'))
+            self.pending.clear()
+
+    async def batch(self, reads=(), writes=(), code='', timeout=_answer_timeout):
+
+        # Does the property writes, runs the Nasal code, then does the
+        # property reads and returns the list of the values read.
+        # Other batches can be sent while this one waits.
+
+        self.seq += 1
+        seq = self.seq
+        future = asyncio.get_running_loop().create_future()
+        self.pending[seq] = future
+        self.send(nasal_batch(seq, reads, writes, code))
+        try:
+            return await asyncio.wait_for(future, timeout)
+        finally:
+            self.pending.pop(seq, None)
+
+    async def recv_instruments(self):
+        self.instruments.set(await self.batch(instrument_props))
+
+    async def send_changes(self, reads=()):
+
+        # Sends the controls that have changed and does the reads.
+
+        code = self.controls.changes()
+        if code == '' and not reads:
+            return []
+        try:
+            return await self.batch(reads, code=code)
+        except BaseException:
+            self.controls.forget()
+            raise
+
+    async def send_controls(self):
+        await self.send_changes()
+
+    async def control_step(self):
+        self.instruments.set(await self.send_changes(instrument_props))
+
+    async def autostart_c172p(self):
+        await self.batch(code='c172p.autostart();')
+
+    async def wait_until(self, reads, condition, timeout, what):
+
+        # Reads the properties until condition(values) is true on
+        # wait_stable reads in a row (see FG.wait_until).
+
+        end = time.time() + timeout
+        stable = 0
+        while True:
+            values = await self.batch(reads)
+            stable = stable + 1 if condition(values) else 0
+            if stable >= wait_stable:
+                return values
+            if time.time() > end:
+                raise TimeoutError(what + ' after ' + format(timeout, '.1f') + 's on ' +
+                                   self.host + ':' + str(self.port))
+            await asyncio.sleep(wait_period)
+
+    async def shutdown_engine(self, timeout=10):
+        await self.batch(writes=shutdown_writes)
+
+        self.controls.throttle = 0
+
+        try:
+            await self.wait_until(engine_reads, engine_stopped, timeout, 'engine not stopped')
+        finally:
+            await self.batch(writes=[('/engines/active-engine/kill-engine', 0)])
+
+    async def reset_aircraft(self, airport: str, runway: str, timeout=20):
+
+        # Puts the aircraft back on the ground with the engine stopped
+        # and returns when it has settled. To do it in the background
+        # use asyncio.create_task(sim.reset_aircraft(...)).
+
+        ap = airports.get(airport, None)
+        if ap is None:
+            print(f'Airport {airport} not found')
+            return
+
+        if ap.runways.get(runway, None) is None:
+            print(f'Runway {runway} not found at {airport}')
+            return
+
+        end = time.time() + timeout
+
+        await self.shutdown_engine(max(0, end - time.time()))
+
+        await self.batch(writes=reset_pause_writes)
+        current_alt, = await self.batch(reset_reads)
+        self.controls.reset()
+        await self.batch(writes=reset_writes(current_alt, self.controls))
+        self.controls.forget()
+        await self.wait_until(settle_reads, settled, max(0, end - time.time()),
+                              'aircraft not settled on the ground')
+        await self.batch(writes=[('/fdm/jsbsim/settings/damage', 0)])
@@ -0,0 +1,219 @@
+# File: evaluate.py
+
+# Scores recorded flights against a course, like the radar does for
+# live planes but without FlightGear or a web browser, so that a
+# controller can be checked on thousands of recorded flights:
+#
+#    python3 evaluate.py LOWI_08_circuit runs/*.csv
+#
+# A recorded flight is either a .csv file with a lat, lon and alt
+# column (and an optional time column, in seconds), or a log file
+# with lines containing lat=..., lon=... and alt=... (and optionally
+# time=...). Lines of a log without a position are ignored. When the
+# time is not recorded, the samples are taken to be period seconds
+# apart. The flights are scored in parallel by a pool of processes.
+
+import csv
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+
+from geodetic import *
+
+
+def course_file(course):
+    if course.endswith('.csv'):
+        return course
+    return os.path.join(os.path.dirname(__file__), '..', 'parcours', course, course + '.csv')
+
+
+def read_csv_track(file, period):
+
+    # Returns the list of (time, Location) samples of a .csv track.
+
+    samples = []
+    columns = None
+    with open(file) as f:
+        for row in csv.reader(f):
+            if len(row) < 2:
+                continue
+            if columns is None and row[0].strip()[:1].isalpha():
+                columns = [name.strip().lower() for name in row]
+                continue
+            if columns is None:
+                columns = ['lat', 'lon', 'alt'][:len(row)]
+            values = dict(zip(columns, row))
+            t = values.get('time', values.get('t'))
+            t = len(samples) * period if t is None else float(t)
+            samples.append((t, Location(float(values['lat']),
+                                        float(values['lon']),
+                                        float(values.get('alt', 0)))))
+    return samples
+
+
+log_field_re = re.compile(r'([A-Za-z_][\w-]*)=\s*(-?[0-9.]+(?:[eE][-+]?[0-9]+)?)')
+
+
+def read_log_track(file, period):
+
+    # Returns the list of (time, Location) samples of a log file with
+    # key=value fields.
+
+    samples = []
+    with open(file) as f:
+        for line in f:
+            if 'lat=' not in line:
+                continue
+            values = dict(log_field_re.findall(line))
+            if 'lat' not in values or 'lon' not in values:
+                continue
+            t = values.get('time', values.get('t'))
+            t = len(samples) * period if t is None else float(t)
+            samples.append((t, Location(float(values['lat']),
+                                        float(values['lon']),
+                                        float(values.get('alt', 0)))))
+    return samples
+
+
+def read_track(file, period=0.2):
+    if file.endswith('.csv'):
+        return read_csv_track(file, period)
+    else:
+        return read_log_track(file, period)
+
+
+def score(path, samples):
+
+    # Follows the samples on the path like the radar does and returns
+    # a dict with the result:
+    #
+    #   status: 'COMPLETED', 'OFF-COURSE', 'INCOMPLETE' or 'NO-DATA'
+    #   progress: fraction of the path that was followed (0 to 1) when
+    #             the plane went off course or at the end of the flight
+    #   off_course: (time, Location) of the first sample off course
+    #   min_dev/max_dev: min/max distance in feet from the path
+    #   time: seconds from the first sample to the completion
+
+    result = {'status': 'NO-DATA', 'samples': len(samples), 'progress': 0,
+              'off_course': None, 'min_dev': None, 'max_dev': None, 'time': None}
+
+    if not samples:
+        return result
+
+    follower = PathFollower(path)
+    start = samples[0][0]
+    min_dev = 1e400
+    max_dev = 0
+    status = 'INCOMPLETE'
+    progress = None
+
+    for t, loc in samples:
+        on_path = follower.update(loc)
+        dev = follower.distance
+        if dev < min_dev: min_dev = dev
+        if dev > max_dev: max_dev = dev
+        if status == 'INCOMPLETE':
+            if not on_path:
+                status = 'OFF-COURSE'
+                result['off_course'] = (t, loc)
+                progress = follower.progress
+            elif follower.has_reached_destination():
+                status = 'COMPLETED'
+                result['time'] = t - start
+                break
+
+    result['status'] = status
+    if progress is None:
+        progress = follower.progress
+    result['progress'] = min(1, progress / max(1, path.length() - 1))
+    result['min_dev'] = min_dev
+    result['max_dev'] = max_dev
+
+    return result
+
+
+# The course is read once by each process of the pool.
+
+_path = None
+
+
+def init_worker(course):
+    global _path
+    _path = read_path_file(course_file(course))
+
+
+def evaluate_file(file, period=0.2):
+    return file, score(_path, read_track(file, period))
+
+
+def evaluate(course, files, period=0.2, jobs=None):
+
+    # Scores the recorded flights in parallel and yields the (file,
+    # result) pairs in the order of the files.
+
+    with ProcessPoolExecutor(max_workers=jobs, initializer=init_worker,
+                             initargs=(course,)) as pool:
+        chunksize = max(1, len(files) // (4 * (jobs or os.cpu_count() or 1)))
+        yield from pool.map(evaluate_file, files, [period] * len(files),
+                            chunksize=chunksize)
+
+
+def format_result(file, result):
+    line = file + ': ' + result['status']
+    line += ' progress=' + format(100 * result['progress'], '.1f') + '%'
+    if result['time'] is not None:
+        line += ' time=' + format(result['time'], '.1f') + 's'
+    if result['off_course'] is not None:
+        t, loc = result['off_course']
+        line += (' off_course=' + format(t, '.1f') + 's@' +
+                 format(loc.lat, '.6f') + ',' + format(loc.lon, '.6f') + ',' +
+                 format(loc.alt, '.0f'))
+    if result['min_dev'] is not None:
+        line += (' dev=' + format(result['min_dev'], '.0f') + '..' +
+                 format(result['max_dev'], '.0f') + 'ft')
+    return line
+
+
+def cli():
+
+    import argparse
+
+    parser = argparse.ArgumentParser(
+                prog = 'evaluate',
+                description = 'Scores recorded flights against a course.')
+    parser.add_argument('course', help='name of a course in parcours/ or .csv file')
+    parser.add_argument('files', nargs='+', help='recorded flights (.csv or log files)')
+    parser.add_argument('--period', type=float, default=0.2,
+                        help='seconds between samples without a time (default: %(default)s)')
+    parser.add_argument('--jobs', type=int, default=None,
+                        help='number of processes (default: number of cores)')
+    parser.add_argument('--csv', help='also write the results to this .csv file')
+    args = parser.parse_args()
+
+    results = []
+    counts = {}
+
+    for file, result in evaluate(args.course, args.files, args.period, args.jobs):
+        print(format_result(file, result))
+        results.append((file, result))
+        counts[result['status']] = counts.get(result['status'], 0) + 1
+
+    print('=== ' + ', '.join(str(counts[s]) + ' ' + s for s in sorted(counts)))
+
+    if args.csv is not None:
+        with open(args.csv, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(['file', 'status', 'samples', 'progress', 'time',
+                             'off_time', 'off_lat', 'off_lon', 'off_alt',
+                             'min_dev', 'max_dev'])
+            for file, r in results:
+                off = r['off_course']
+                off = ['', '', '', ''] if off is None else [off[0], off[1].lat, off[1].lon, off[1].alt]
+                writer.writerow([file, r['status'], r['samples'], r['progress'],
+                                 '' if r['time'] is None else r['time']] + off +
+                                ['' if r['min_dev'] is None else r['min_dev'],
+                                 '' if r['max_dev'] is None else r['max_dev']])
+
+
+if __name__ == '__main__':
+    cli()
@@ -1,5 +1,24 @@
 # File: parcours_gen
 
+# Generation of the courses of the Hackathon. A course is given by an
+# airport, a runway and a pattern (roll, takeoff, partial, circuit,
+# impossible, mountain, river or crosscountry), and its name is
+# AIRPORT_RUNWAY_PATTERN:
+#
+#    python3 parcours_gen.py                      # all the courses of the Hackathon
+#    python3 parcours_gen.py LOWI_08_circuit ...  # some courses
+#
+# The courses are written to parcours/NAME/NAME.csv (and .kml) and
+# are generated in parallel by a pool of processes. A course can also
+# be generated in a program, without writing files:
+#
+#    course = generate('LOWI', '08', 'circuit', circuit_alt=1200)
+#    course['lat'], course['lon'], course['alt'], course['tol']
+
+import array
+import os
+from concurrent.futures import ProcessPoolExecutor
+
 from airports import *
 from geodetic import *
 
@@ -7,7 +26,6 @@ from geodetic import *
 path_segment_length = 200
 ground_run = 1900
 extra_tol = 500
-turn = None
 
 mountain_start = Location(47.2870, 11.3050, 5600)
 mountain_end   = Location(47.2895, 11.2950, 5600)
@@ -15,227 +33,310 @@ mountain_end   = Location(47.2895, 11.2950, 5600)
 river_start = Location(47.26495, 11.3114, 1930)
 river_end   = Location(47.26445, 11.3064, 1930)
 
+patterns = ['roll', 'takeoff', 'partial', 'circuit', 'impossible',
+            'mountain', 'river', 'crosscountry']
 
-pos = None
-tol = None
 
-output = None
+class CourseGenerator:
 
+    # Draws a course from the runway of an airport. The position,
+    # bearing and tolerance of the pen are those of the last point and
+    # the points are added to columns of doubles.
 
-def print_pos():
-    global output
-    line = (str(pos.lat) + ',' +
-            str(pos.lon) + ',' +
-            str(pos.alt) + ',' + str(round(tol)))
-    output += line + '\n'
-    #print(line)
+    def __init__(self, airport, runway, ground_run=ground_run, circuit_alt=1000,
+                 turn=None, tol=None):
 
+        # airport, runway: where the course starts
+        # ground_run: distance in feet rolled on the runway
+        # circuit_alt: altitude in feet of the circuit above the runway
+        # turn: total turn in degrees of a leg of the circuit (by
+        #       default 90 or -90 depending on the runway)
+        # tol: initial tolerance in feet (by default depends on the
+        #      airport)
 
-def advance(dist_gain, alt_gain, bearing_gain, tolerance_gain):
+        if airport == 'LOWI':
+            default_turn = 90 if runway == '08' else -90
+            default_tol = 80
+        elif airport == 'LOIJ':
+            default_turn = 90 if runway == '13' else -90
+            default_tol = 50
+        else:
+            default_turn = 90
+            default_tol = 100
 
-    global pos, bearing, tol
+        self.ground_run = ground_run
+        self.circuit_alt = circuit_alt
+        self.turn = default_turn if turn is None else turn
+        self.initial_tol = default_tol if tol is None else tol
 
-    n = round(dist_gain/path_segment_length)
-    d = dist_gain/n
-    a = alt_gain/n
-    b = bearing_gain/n
-    t = tolerance_gain/n
+        rw = airports[airport].runways[runway]
+        self.rw_start = rw.location
+        self.rw_end = airports[airport].runways[rw.reverse].location
 
-    while n > 0:
-        bearing += b
-        tol += t
-        pos = pos.destination(bearing, d)
-        pos.alt += a
-        print_pos()
-        n -= 1
+        self.pos = None
+        self.bearing = None
+        self.tol = self.initial_tol
 
+        self.lat = array.array('d')
+        self.lon = array.array('d')
+        self.alt = array.array('d')
+        self.tols = array.array('d')
 
-def roll(rw_start, rw_end, ground_run):
+    def columns(self):
+        return {'lat': self.lat, 'lon': self.lon, 'alt': self.alt, 'tol': self.tols}
 
-    global pos, bearing, tol
+    def add_pos(self):
+        pos = self.pos
+        self.lat.append(pos.lat)
+        self.lon.append(pos.lon)
+        self.alt.append(pos.alt)
+        self.tols.append(self.tol)
 
-    rw_length = rw_start.distance(rw_end)
-    rw_bearing = rw_start.bearing(rw_end)
+    def advance(self, dist_gain, alt_gain, bearing_gain, tolerance_gain):
 
-    pos = rw_start.destination(rw_bearing, -120)
-    bearing = rw_bearing
+        n = round(dist_gain/path_segment_length)
+        d = dist_gain/n
+        a = alt_gain/n
+        b = bearing_gain/n
+        t = tolerance_gain/n
 
-    print_pos()
+        while n > 0:
+            self.bearing += b
+            self.tol += t
+            self.pos = self.pos.destination(self.bearing, d)
+            self.pos.alt += a
+            self.add_pos()
+            n -= 1
 
-    advance(ground_run, 0, 0, 0)
+    def roll(self):
 
+        rw_bearing = self.rw_start.bearing(self.rw_end)
 
-def takeoff(rw_start, rw_end, ground_run, circuit_alt):
+        self.pos = self.rw_start.destination(rw_bearing, -120)
+        self.bearing = rw_bearing
 
-    roll(rw_start, rw_end, ground_run)
+        self.add_pos()
 
-    advance(1500, 0.3*circuit_alt, 0, extra_tol)
+        self.advance(self.ground_run, 0, 0, 0)
 
+    def takeoff(self):
 
-def partial(rw_start, rw_end, ground_run, circuit_alt, turn):
+        self.roll()
 
-    takeoff(rw_start, rw_end, ground_run, circuit_alt)
+        self.advance(1500, 0.3*self.circuit_alt, 0, extra_tol)
 
-    advance(2000, 0.2*circuit_alt, turn, 0)
-    advance(2700, 0.3*circuit_alt, 0, 0)
-    advance(2000, 0.2*circuit_alt, turn, 0)
+    def partial(self):
 
-    advance(ground_run+2000, 0, 0, 0)
+        circuit_alt = self.circuit_alt
+        turn = self.turn
 
+        self.takeoff()
 
-def circuit(rw_start, rw_end, ground_run, circuit_alt, turn):
+        self.advance(2000, 0.2*circuit_alt, turn, 0)
+        self.advance(2700, 0.3*circuit_alt, 0, 0)
+        self.advance(2000, 0.2*circuit_alt, turn, 0)
 
-    takeoff(rw_start, rw_end, ground_run, circuit_alt)
+        self.advance(self.ground_run+2000, 0, 0, 0)
 
-    advance(2000, 0.2*circuit_alt, turn, 0)
-    advance(2700, 0.3*circuit_alt, 0, 0)
-    advance(2000, 0.2*circuit_alt, turn, 0)
+    def circuit(self):
 
-    advance(ground_run+3900, 0, 0, 0)
+        circuit_alt = self.circuit_alt
+        turn = self.turn
 
-    advance(2000, -0.2*circuit_alt, turn, 0)
-    advance(2700, -0.3*circuit_alt, 0, 0)
-    advance(2000, -0.2*circuit_alt, turn, 0)
-    advance(2700, -0.3*circuit_alt, 0, -extra_tol)
+        self.takeoff()
 
-    advance(500, 0, 0, 0)
+        self.advance(2000, 0.2*circuit_alt, turn, 0)
+        self.advance(2700, 0.3*circuit_alt, 0, 0)
+        self.advance(2000, 0.2*circuit_alt, turn, 0)
 
+        self.advance(self.ground_run+3900, 0, 0, 0)
 
-def impossible(rw_start, rw_end, ground_run, circuit_alt, turn):
+        self.advance(2000, -0.2*circuit_alt, turn, 0)
+        self.advance(2700, -0.3*circuit_alt, 0, 0)
+        self.advance(2000, -0.2*circuit_alt, turn, 0)
+        self.advance(2700, -0.3*circuit_alt, 0, -extra_tol)
 
-    takeoff(rw_start, rw_end, ground_run, circuit_alt)
+        self.advance(500, 0, 0, 0)
 
-    advance(1000, 0.2*circuit_alt, turn/2, 0)
-    advance(925, 0, 0, 0)
-    advance(1000, -0.1*circuit_alt, -turn/2, 0)
-    advance(900, -0.1*circuit_alt, 0, 0)
-    advance(2200, -0.2*circuit_alt, -2*turn, 0)
-    advance(900, -0.1*circuit_alt, 0, -extra_tol)
+    def impossible(self):
 
-    advance(200, 0, 0, 0)
+        circuit_alt = self.circuit_alt
+        turn = self.turn
 
+        self.takeoff()
 
-def flyover(rw_start, rw_end, ground_run, circuit_alt, flyover_start, flyover_end, flyover_tol, turn):
+        self.advance(1000, 0.2*circuit_alt, turn/2, 0)
+        self.advance(925, 0, 0, 0)
+        self.advance(1000, -0.1*circuit_alt, -turn/2, 0)
+        self.advance(900, -0.1*circuit_alt, 0, 0)
+        self.advance(2200, -0.2*circuit_alt, -2*turn, 0)
+        self.advance(900, -0.1*circuit_alt, 0, -extra_tol)
 
-    global pos, bearing, tol
+        self.advance(200, 0, 0, 0)
 
-    takeoff(rw_start, rw_end, ground_run, circuit_alt)
+    def flyover(self, flyover_start, flyover_end, flyover_tol, turn):
 
-    if turn != 0:
-        advance(2000, 0.2*circuit_alt, turn, 0)
+        self.takeoff()
 
-    tol = 0
+        if turn != 0:
+            self.advance(2000, 0.2*self.circuit_alt, turn, 0)
 
-    print_pos()
+        self.tol = 0
 
-    pos = flyover_start
+        self.add_pos()
 
-    print_pos()
+        self.pos = flyover_start
 
-    tol = flyover_tol
+        self.add_pos()
 
-    print_pos()
+        self.tol = flyover_tol
 
-    bearing = flyover_start.bearing(flyover_end)
+        self.add_pos()
 
-    advance(flyover_start.distance(flyover_end), 0, 0, 0)
+        self.bearing = flyover_start.bearing(flyover_end)
 
+        self.advance(flyover_start.distance(flyover_end), 0, 0, 0)
 
-def airport_setup(airport, runway):
+    def mountain(self):
+        self.flyover(mountain_start, mountain_end, 250, 45)
 
-    global ground_run, circuit_alt, tol, turn, rw_start, rw_end
+    def river(self):
+        self.flyover(river_start, river_end, 100, 15)
 
-    if airport == 'LOWI':
-        if runway == '08':
-            turn = 90
-        else:
-            turn = -90
-        tol = 80
-    elif airport == 'LOIJ':
-        if runway == '13':
-            turn = 90
-        else:
-            turn = -90
-        tol = 50
-    else:
-        tol = 100
-
-    circuit_alt = 1000
-
-    rw = airports[airport].runways[runway]
-    rw_start = rw.location
-    rw_end   = airports[airport].runways[rw.reverse].location
-
-
-def gen(airport, runway, pattern):
-
-    global output, rw_start, rw_end
-
-    output = ''
-
-    airport_setup(airport, runway)
-
-    if pattern == 'roll':
-        roll(rw_start, rw_end, ground_run)
-    elif pattern == 'takeoff':
-        takeoff(rw_start, rw_end, ground_run, circuit_alt)
-    elif pattern == 'partial':
-        partial(rw_start, rw_end, ground_run, circuit_alt, turn)
-    elif pattern == 'circuit':
-        circuit(rw_start, rw_end, ground_run, circuit_alt, turn)
-    elif pattern == 'impossible':
-        impossible(rw_start, rw_end, ground_run, circuit_alt, turn)
-    elif pattern == 'mountain':
-        flyover(rw_start, rw_end, ground_run, circuit_alt,
-                mountain_start, mountain_end, 250, 45)
-    elif pattern == 'river':
-        flyover(rw_start, rw_end, ground_run, circuit_alt,
-                river_start, river_end, 100, 15)
-    elif pattern == 'crosscountry':
-        dest = 'LOIJ'
-        rw = '13'
-        rw_reverse = '31'
-        dest_start = airports[dest].runways[rw].location
-        dest_end   = airports[dest].runways[rw_reverse].location
-        dest_start.alt += 200
-        dest_end.alt += 200
-        flyover(rw_start, rw_end, ground_run, circuit_alt,
-                dest_start, dest_end, 250, -5)
+    def crosscountry(self):
+        dest_start = airports['LOIJ'].runways['13'].location
+        dest_end   = airports['LOIJ'].runways['31'].location
+        self.flyover(Location(dest_start.lat, dest_start.lon, dest_start.alt + 200),
+                     Location(dest_end.lat, dest_end.lon, dest_end.alt + 200),
+                     250, -5)
 
-    name = airport + '_' + runway + '_' + pattern
 
-    dump_path(name)
+def generate(airport, runway, pattern, **options):
+
+    # Returns the course as a dict of columns ('lat', 'lon', 'alt' and
+    # 'tol', arrays of doubles). The options are those of
+    # CourseGenerator.
+
+    if pattern not in patterns:
+        raise ValueError('unknown pattern ' + pattern)
+
+    generator = CourseGenerator(airport, runway, **options)
+    getattr(generator, pattern)()
+
+    return generator.columns()
+
 
+def course_csv(course):
 
-def dump_path(name):
+    # Returns the text of the .csv file of the course.
 
-    import os
+    lines = ['lat,lon,alt,tol\n']
+    lines.extend([str(lat) + ',' + str(lon) + ',' + str(alt) + ',' + str(round(tol)) + '\n'
+                  for lat, lon, alt, tol in zip(course['lat'], course['lon'],
+                                                course['alt'], course['tol'])])
+    return ''.join(lines)
 
-    root_dir = 'parcours'
-    if not os.path.exists(root_dir):
-        os.makedirs(root_dir)
 
-    specific_dir = root_dir + '/' + name
-    if not os.path.exists(specific_dir):
-        os.makedirs(specific_dir)
+def dump_path(name, course, root_dir='parcours', kml=True):
 
-    csv_file = specific_dir + '/' + name + '.csv'
+    # Writes the course to root_dir/name/name.csv (and .kml) and
+    # returns the path of the .csv file.
+
+    specific_dir = os.path.join(root_dir, name)
+    os.makedirs(specific_dir, exist_ok=True)
+
+    csv_file = os.path.join(specific_dir, name + '.csv')
     with open(csv_file, 'w') as f:
-        f.write('lat,lon,alt,tol\n' + output)
+        f.write(course_csv(course))
+
+    if kml:
+        to_kml(csv_file, True)
+
+    return csv_file
+
+
+def gen(airport, runway, pattern, root_dir='parcours', kml=True):
+
+    # Generates the course and writes its files. Returns the name of
+    # the course and its number of points.
+
+    name = airport + '_' + runway + '_' + pattern
+
+    course = generate(airport, runway, pattern)
+    dump_path(name, course, root_dir, kml)
 
-    to_kml(csv_file, True)
+    return name, len(course['lat'])
 
 
 def challenges():
 
+    # Returns the (airport, runway, pattern) of the courses of the
+    # Hackathon.
+
+    specs = []
+
     for pattern in ['roll', 'takeoff', 'partial', 'circuit', 'impossible']:
         for airport in ['LOWI', 'LOIJ']:
             if not (airport == 'LOIJ' and pattern == 'impossible'):
                 for runway in airports[airport].runways:
-                    gen(airport, runway, pattern)
+                    specs.append((airport, runway, pattern))
+
+    specs.append(('LOWI', '26', 'mountain'))
+    specs.append(('LOWI', '26', 'river'))
+    specs.append(('LOWI', '08', 'crosscountry'))
+
+    return specs
+
+
+def parse_spec(name):
+
+    # Returns the (airport, runway, pattern) of a course name like
+    # LOWI_08_circuit.
+
+    parts = name.split('_')
+    if len(parts) != 3:
+        raise ValueError('course name must be AIRPORT_RUNWAY_PATTERN: ' + name)
+
+    return tuple(parts)
+
+
+def gen_all(specs, root_dir='parcours', kml=True, jobs=None):
+
+    # Generates the courses in parallel and yields the (name, number
+    # of points) of each course in the order of the specs.
+
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        futures = [pool.submit(gen, airport, runway, pattern, root_dir, kml)
+                   for airport, runway, pattern in specs]
+        for future in futures:
+            yield future.result()
+
+
+def cli():
+
+    import argparse
+
+    parser = argparse.ArgumentParser(
+                prog = 'parcours_gen',
+                description = 'Generates the courses of the Hackathon.')
+    parser.add_argument('courses', nargs='*',
+                        help='names of the courses like LOWI_08_circuit (default: all the courses of the Hackathon)')
+    parser.add_argument('--out', default='parcours',
+                        help='directory of the courses (default: %(default)s)')
+    parser.add_argument('--no-kml', action='store_true',
+                        help='do not write the .kml files')
+    parser.add_argument('--jobs', type=int, default=None,
+                        help='number of processes (default: number of cores)')
+    args = parser.parse_args()
+
+    if args.courses:
+        specs = [parse_spec(name) for name in args.courses]
+    else:
+        specs = challenges()
+
+    for name, points in gen_all(specs, args.out, not args.no_kml, args.jobs):
+        print(name + ': ' + str(points) + ' points')
 
-    gen('LOWI', '26', 'mountain')
-    gen('LOWI', '26', 'river')
-    gen('LOWI', '08', 'crosscountry')
 
-challenges()
+if __name__ == '__main__':
+    cli()
@@ -0,0 +1,142 @@
+# File: recorder.py
+
+# Recording of the flight telemetry in a binary file. Each record is
+# the time and all the fields of Instruments and Controls as doubles,
+# appended to a memory mapped file so that recording at 50 Hz costs a
+# few microseconds per record. The last records are also kept in
+# memory for live access.
+#
+#    from FG import *
+#    sim_record_start('flight.rec')  # record each reading of the instruments
+#    ...                             # and each sending of the controls
+#
+#    from recorder import read_recording
+#    data = read_recording('flight.rec')
+#    data['time'], data['lat'], data['elevator'], ...
+#
+# The file starts with a header of header_size bytes:
+#
+#    magic      8 bytes   b'FGREC\0\0\1'
+#    count      uint64    number of records in the file
+#    fields     uint32    number of fields per record
+#
+# followed by the records (fields doubles each, in the order of
+# record_fields). The count is updated after each record is written,
+# so a recording interrupted by a crash can still be read.
+
+import collections
+import mmap
+import struct
+
+try:
+    import numpy as np
+except ImportError:  # numpy is only needed by Recorder.array and read_recording
+    np = None
+
+record_fields = ['time',
+                 'ias', 'alt', 'alt_agl', 'lat', 'lon', 'heading', 'pitch', 'roll',
+                 'elevator', 'aileron', 'rudder', 'flaps', 'throttle', 'mixture',
+                 'brake', 'parking']
+
+magic = b'FGREC\0\0\1'
+header = struct.Struct('<8sQI')
+header_size = 64
+record = struct.Struct('<' + 'd' * len(record_fields))
+
+_grow_size = 1 << 20  # bytes added to the file when it is full
+
+
+def record_dtype():
+    if np is None:
+        raise ImportError('recorder arrays require numpy')
+    return np.dtype([(name, '<f8') for name in record_fields])
+
+
+class Recorder:
+
+    def __init__(self, path, ring_size=3000):
+
+        # path: file of the recording (overwritten)
+        # ring_size: number of records kept in memory (1 minute at 50 Hz)
+
+        self.path = path
+        self.file = open(path, 'w+b')
+        self.size = header_size + _grow_size
+        self.file.truncate(self.size)
+        self.map = mmap.mmap(self.file.fileno(), self.size)
+        self.count = 0
+        self.offset = header_size
+        self.ring = collections.deque(maxlen=ring_size)
+        header.pack_into(self.map, 0, magic, 0, len(record_fields))
+
+    def grow(self):
+        # no array uses the old map (array() copies the records)
+        self.map.close()
+        self.size += _grow_size
+        self.file.truncate(self.size)
+        self.map = mmap.mmap(self.file.fileno(), self.size)
+
+    def record(self, instruments, controls, t=None):
+
+        # t: time of the record (by default the time the instruments
+        #    were read)
+
+        loc = instruments.loc
+        values = (instruments.time if t is None else t,
+                  instruments.ias, loc.alt, instruments.alt_agl, loc.lat, loc.lon,
+                  instruments.heading, instruments.pitch, instruments.roll,
+                  controls.elevator, controls.aileron, controls.rudder, controls.flaps,
+                  controls.throttle, controls.mixture, controls.brake, controls.parking)
+        self.append(values)
+
+    def append(self, values):
+        if self.offset + record.size > self.size:
+            self.grow()
+        record.pack_into(self.map, self.offset, *values)
+        self.offset += record.size
+        self.count += 1
+        struct.pack_into('<Q', self.map, 8, self.count)
+        self.ring.append(values)
+
+    def last(self, n=1):
+
+        # Returns the n last records (tuples in the order of
+        # record_fields) kept in memory.
+
+        n = min(n, len(self.ring))
+        return [self.ring[i] for i in range(len(self.ring) - n, len(self.ring))]
+
+    def array(self):
+
+        # Returns a numpy structured array of all the records. It is a
+        # copy, so it stays valid when the file grows or is closed and
+        # does not see the records appended later.
+
+        if self.map is None:
+            raise ValueError('recorder is closed')
+        return np.frombuffer(self.map, dtype=record_dtype(), count=self.count,
+                             offset=header_size).copy()
+
+    def close(self):
+        if self.map is None:
+            return
+        self.map.flush()
+        self.map.close()
+        self.map = None
+        self.file.truncate(self.offset)
+        self.file.close()
+
+
+def read_recording(path):
+
+    # Returns the records of a recording as a numpy structured array
+    # mapped on the file (nothing is copied).
+
+    with open(path, 'rb') as f:
+        m, count, fields = header.unpack(f.read(header.size))
+    if m != magic or fields != len(record_fields):
+        raise ValueError(path + ' is not a recording')
+    if count == 0:
+        return np.zeros(0, dtype=record_dtype())
+    return np.memmap(path, dtype=record_dtype(), mode='r', offset=header_size,
+                     shape=(count,))
@@ -0,0 +1,232 @@
+# File: test_FG.py
+
+# Checks of FG.py against a fake FlightGear telnet server that runs the
+# batches sent by FG.nasal_batch on a dict of properties:
+#
+#    python3 -m unittest test_FG     (or python3 -m pytest)
+
+import re
+import socket
+import threading
+import time
+import unittest
+
+import FG
+
+
+class FakeFlightGear:
+
+    # Listens on a local port and answers the Nasal batches like
+    # FlightGear in data mode. The answers can be cut in chunks of
+    # chunk bytes, preceded by a prompt, preceded by the answer of
+    # another batch (a stale line with a wrong sequence number) or by
+    # lines that are not answers (junk), held until reverse batches
+    # have arrived and sent in the reverse order, or the connection
+    # can be closed instead of answering (hangup).
+
+    def __init__(self):
+        self.props = {}
+        self.chunk = None
+        self.prompt = ''
+        self.stale = False
+        self.junk = False
+        self.reverse = 0
+        self.hangup = False
+        self.scripts = []
+        self.server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.server.bind(('127.0.0.1', 0))
+        self.server.listen()
+        self.port = self.server.getsockname()[1]
+        threading.Thread(target=self.accept, daemon=True).start()
+
+    def accept(self):
+        while True:
+            try:
+                conn, _ = self.server.accept()
+            except OSError:
+                return
+            threading.Thread(target=self.serve, args=(conn,), daemon=True).start()
+
+    def serve(self, conn):
+        conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        buf = b''
+        held = []
+        while True:
+            data = conn.recv(4096)
+            if not data:
+                conn.close()
+                return
+            buf += data
+            while b'##EOF##\r\n' in buf:
+                frame, buf = buf.split(b'##EOF##\r\n', 1)
+                script = frame.decode().split('nasal\r\n', 1)[-1]
+                self.scripts.append(script)
+                if self.hangup:
+                    conn.close()
+                    return
+                held.append(self.run(script))
+                if len(held) >= self.reverse:
+                    for answer in reversed(held):
+                        self.send(conn, answer)
+                    held = []
+
+    def run(self, script):
+        for prop, value in re.findall(r'setprop\("([^"]+)",([^)]*)\)', script):
+            self.props[prop] = float(value)
+        m = re.search(r'sprintf\("\[%d[^"]*",(\d+)((?:,getprop\("[^"]+"\))*)\)', script)
+        seq = int(m.group(1))
+        values = ''.join(',%f' % self.props.get(prop, 0)
+                         for prop in re.findall(r'getprop\("([^"]+)"\)', m.group(2)))
+        answer = self.prompt + '[' + str(seq) + values + ']\r\n'
+        if self.stale:
+            answer = '[' + str(seq - 1) + ',-1]\r\n' + answer
+        if self.junk:
+            answer = '[]\r\n[[1],2]\r\n{"a":1}\r\n3\r\n' + answer
+        return answer.encode()
+
+    def send(self, conn, answer):
+        if self.chunk is None:
+            conn.sendall(answer)
+        else:
+            for i in range(0, len(answer), self.chunk):
+                conn.sendall(answer[i:i+self.chunk])
+                time.sleep(0.001)
+
+    def close(self):
+        self.server.close()
+
+
+class BatchTest(unittest.TestCase):
+
+    def setUp(self):
+        self.fg = FakeFlightGear()
+        self.conn = FG.FGConnection('127.0.0.1', self.fg.port)
+        self.conn.connect()
+        self.conn.sock.settimeout(2)
+
+    def tearDown(self):
+        self.conn.close()
+        self.fg.close()
+
+    def test_writes_then_reads(self):
+        values = self.conn.batch(['/a', '/b'], [('/a', 1.5), ('/b', -2)])
+        self.assertEqual(values, [1.5, -2.0])
+        self.assertEqual(self.conn.batch(writes=[('/a', 3)]), [])
+        self.assertEqual(self.conn.batch(['/a']), [3.0])
+
+    def test_sequence_numbers(self):
+        self.conn.batch(['/a'])
+        self.conn.batch(['/a'])
+        seqs = [int(re.search(r'\\r\\n",(\d+)', s).group(1)) for s in self.fg.scripts]
+        self.assertEqual(seqs, [1, 2])
+
+    def test_split_lines(self):
+        self.fg.props['/a'] = 12.25
+        self.fg.chunk = 3  # every answer arrives in pieces
+        for _ in range(3):
+            self.assertEqual(self.conn.batch(['/a', '/a']), [12.25, 12.25])
+
+    def test_prompt(self):
+        self.fg.prompt = '/> '
+        self.fg.props['/a'] = 4
+        self.assertEqual(self.conn.batch(['/a']), [4.0])
+
+    def test_mismatched_seq(self):
+        self.fg.props['/a'] = 1
+        self.fg.stale = True  # a line of another batch comes first
+        self.assertEqual(self.conn.batch(['/a']), [1.0])
+        self.assertEqual(self.conn.batch(['/a']), [1.0])
+
+    def test_partial_line_kept(self):
+
+        # a line received in part before a timeout is completed by the
+        # next read
+
+        self.conn.buffer.extend(b'[7,1.0')
+        self.conn.sock.settimeout(0.05)
+        with self.assertRaises(OSError):  # socket.timeout
+            self.conn.recv_line()
+        self.assertEqual(bytes(self.conn.buffer), b'[7,1.0')
+        self.conn.buffer.extend(b',2.0]\r\n[8]\r\n')
+        self.assertEqual(self.conn.recv_line(), '[7,1.0,2.0]')
+        self.assertEqual(self.conn.recv_line(), '[8]')
+
+
+class StreamTest(unittest.TestCase):
+
+    # Samples sent to InstrumentStream like FlightGear does with the
+    # generic protocol of instruments.xml (one line of comma separated
+    # values per datagram).
+
+    def setUp(self):
+        self.stream = FG.InstrumentStream(0, '127.0.0.1')
+        self.address = self.stream.sock.getsockname()
+        self.sender = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.max_age = FG._stream_max_age
+
+    def tearDown(self):
+        FG._stream_max_age = self.max_age
+        self.sender.close()
+        self.stream.close()
+
+    def send(self, line):
+        samples = self.stream.samples
+        self.sender.sendto(line, self.address)
+        end = time.time() + 1
+        while self.stream.samples == samples and time.time() < end:
+            time.sleep(0.001)
+
+    def test_decode(self):
+        self.assertIsNone(self.stream.latest())
+        self.send(b'95.5,3000.25,1100,47.26,11.35,81.5,4.6,-0.3\n')
+        t, values = self.stream.latest()
+        self.assertEqual(values, [95.5, 3000.25, 1100, 47.26, 11.35, 81.5, 4.6, -0.3])
+        instruments = FG.Instruments()
+        instruments.set(values, t)
+        self.assertEqual(instruments.loc.lat, 47.26)
+        self.assertEqual(instruments.roll, -0.3)
+        self.assertEqual(instruments.time, t)
+
+    def test_bad_datagrams(self):
+        self.sender.sendto(b'1,2,3\n', self.address)  # not all the instruments
+        self.sender.sendto(b'1,2,x,4,5,6,7,8\n', self.address)  # not numbers
+        self.send(b'1,2,3,4,5,6,7,8\n')
+        self.assertEqual(self.stream.samples, 1)
+        self.assertEqual(self.stream.latest()[1], [1, 2, 3, 4, 5, 6, 7, 8])
+
+    def test_stale(self):
+        FG._stream_max_age = 0.05
+        self.send(b'1,2,3,4,5,6,7,8\n')
+        self.assertIsNotNone(self.stream.latest())
+        time.sleep(0.1)
+        self.assertIsNone(self.stream.latest())
+
+    def test_fallback_to_telnet(self):
+
+        # recv_instruments uses the stream while its samples are
+        # recent and reads the instruments with a batch otherwise
+
+        FG._stream_max_age = 0.05
+        fg = FakeFlightGear()
+        conn = FG.FGConnection('127.0.0.1', fg.port)
+        try:
+            conn.connect()
+            conn.sock.settimeout(2)
+            conn.stream = self.stream
+            fg.props[FG.instrument_props[0]] = 42
+            self.send(b'1,2,3,4,5,6,7,8\n')
+            conn.recv_instruments()
+            self.assertEqual(conn.instruments.ias, 1)
+            self.assertEqual(fg.scripts, [])
+            time.sleep(0.1)
+            conn.recv_instruments()
+            self.assertEqual(conn.instruments.ias, 42)
+            self.assertEqual(len(fg.scripts), 1)
+        finally:
+            conn.stream = None  # closed by tearDown
+            conn.close()
+            fg.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
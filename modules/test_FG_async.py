@@ -0,0 +1,67 @@
+# File: test_FG_async.py
+
+# Checks of FG_async.py against the fake FlightGear of test_FG.py:
+#
+#    python3 -m unittest test_FG_async     (or python3 -m pytest)
+
+import asyncio
+import unittest
+
+from FG_async import FGAsync
+from test_FG import FakeFlightGear
+
+
+class AsyncBatchTest(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.fg = FakeFlightGear()
+        self.conn = FGAsync('127.0.0.1', self.fg.port)
+        await self.conn.connect()
+
+    async def asyncTearDown(self):
+        await self.conn.close()
+        self.fg.close()
+
+    async def test_concurrent_batches(self):
+        self.fg.props['/a'] = 1
+        self.fg.props['/b'] = 2
+        values = await asyncio.gather(*[self.conn.batch([prop], timeout=2)
+                                        for prop in ['/a', '/b'] * 10])
+        self.assertEqual(values, [[1.0], [2.0]] * 10)
+        self.assertEqual(self.conn.pending, {})
+
+    async def test_out_of_order(self):
+
+        # the answers of three batches come back last first
+
+        self.fg.props['/a'] = 1
+        self.fg.props['/b'] = 2
+        self.fg.props['/c'] = 3
+        self.fg.reverse = 3
+        values = await asyncio.gather(*[self.conn.batch([prop], timeout=2)
+                                        for prop in ['/a', '/b', '/c']])
+        self.assertEqual(values, [[1.0], [2.0], [3.0]])
+
+    async def test_old_seq_and_junk(self):
+
+        # the answer of an earlier batch and lines that are not answers
+        # are skipped
+
+        self.fg.props['/a'] = 4
+        self.assertEqual(await self.conn.batch(['/a'], timeout=2), [4.0])
+        self.fg.stale = True
+        self.fg.junk = True
+        self.fg.prompt = '/> '
+        self.assertEqual(await self.conn.batch(['/a'], timeout=2), [4.0])
+        self.assertEqual(await self.conn.batch(['/a'], timeout=2), [4.0])
+        self.assertFalse(self.conn.reader_task.done())
+
+    async def test_closed_connection(self):
+        self.fg.hangup = True
+        with self.assertRaises(ConnectionError):
+            await self.conn.batch(['/a'], timeout=2)
+        self.assertEqual(self.conn.pending, {})
+
+
+if __name__ == '__main__':
+    unittest.main()
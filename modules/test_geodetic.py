@@ -0,0 +1,207 @@
+# File: test_geodetic.py
+
+# Checks of geodetic.py against the courses in parcours/:
+#
+#    python3 -m unittest test_geodetic     (or python3 -m pytest)
+
+import glob
+import io
+import os
+import random
+import re
+import unittest
+
+import numpy as np
+
+from geodetic import *
+
+courses = sorted(glob.glob(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                        '..', 'parcours', '*', '*.csv')))
+
+
+class SegmentDistTest(unittest.TestCase):
+
+    # The projection of Path.segment_dist finds the same closest point
+    # as the bisection search, to within the resolution of the
+    # bisection.
+
+    def test_against_bisection(self):
+        self.assertTrue(courses)
+        rng = random.Random(0)
+        for course in courses:
+            path = read_path_file(course)
+            for i in range(path.length()):
+                segment = path.segment(i)
+                loc0, loc1 = segment.locations
+                length = loc0.distance(loc1)
+                if length == 0:
+                    continue
+                for _ in range(5):
+                    loc = loc0.interpolate(loc1, rng.uniform(-0.2, 1.2))
+                    loc = loc.destination(rng.uniform(0, 360), rng.uniform(0, 1500))
+                    loc.alt += rng.uniform(-300, 300)
+                    pos, dist = segment.segment_dist(loc)
+                    pos_b, dist_b = segment.segment_dist_bisection(loc)
+                    msg = os.path.basename(course) + ' segment ' + str(i)
+                    self.assertAlmostEqual(dist, dist_b, delta=0.5, msg=msg)
+                    self.assertAlmostEqual(pos * length, pos_b * length, delta=3, msg=msg)
+
+
+def read_paths():
+    return [(os.path.basename(course), read_path_file(course)) for course in courses]
+
+
+class LocationArrayTest(unittest.TestCase):
+
+    # The vectorized methods of LocationArray give the same results as
+    # those of Location, between the consecutive points of the courses
+    # and from all their points to one Location.
+
+    def assertAngle(self, a, b, msg):
+        self.assertAlmostEqual((a - b + 180) % 360 - 180, 0, delta=1e-6, msg=msg)
+
+    def test_against_location(self):
+        rng = random.Random(0)
+        for name, path in read_paths():
+            points = path.to_array()
+            locations = path.locations
+            first, second = points[:-1], points[1:]
+            origin = locations[len(locations) // 2]
+            bearings = [rng.uniform(0, 360) for _ in locations]
+            dists = [rng.uniform(0, 20000) for _ in locations]
+            pos = [rng.uniform(-0.2, 1.2) for _ in locations[1:]]
+
+            distance = first.distance(second)
+            haversine = first.distance_haversine(second)
+            bearing = first.bearing(second)
+            interpolated = first.interpolate(second, pos)
+            for i, (loc0, loc1) in enumerate(zip(locations, locations[1:])):
+                msg = name + ' point ' + str(i)
+                self.assertAlmostEqual(distance[i], loc0.distance(loc1), delta=1e-6, msg=msg)
+                self.assertAlmostEqual(haversine[i], loc0.distance_haversine(loc1),
+                                       delta=1e-6, msg=msg)
+                self.assertAngle(bearing[i], loc0.bearing(loc1), msg)
+                loc = loc0.interpolate(loc1, pos[i])
+                self.assertAlmostEqual(interpolated.lat[i], loc.lat, delta=1e-9, msg=msg)
+                self.assertAlmostEqual(interpolated.lon[i], loc.lon, delta=1e-9, msg=msg)
+                self.assertAlmostEqual(interpolated.alt[i], loc.alt, delta=1e-6, msg=msg)
+
+            distance = points.distance(origin)
+            bearing = points.bearing(origin)
+            destination = points.destination(bearings, dists)
+            for i, loc in enumerate(locations):
+                msg = name + ' point ' + str(i)
+                self.assertAlmostEqual(distance[i], loc.distance(origin), delta=1e-6, msg=msg)
+                self.assertAngle(bearing[i], loc.bearing(origin), msg)
+                dest = loc.destination(bearings[i], dists[i])
+                self.assertAlmostEqual(destination.lat[i], dest.lat, delta=1e-9, msg=msg)
+                self.assertAlmostEqual(destination.lon[i], dest.lon, delta=1e-9, msg=msg)
+                self.assertEqual(destination.alt[i], dest.alt, msg=msg)
+
+            some = points[::max(1, len(points) // 20)]
+            table = some.distance(some, outer=True)
+            for i, loc0 in enumerate(some.locations()):
+                for j, loc1 in enumerate(some.locations()):
+                    self.assertAlmostEqual(table[i, j], loc0.distance(loc1), delta=1e-6, msg=name)
+
+
+class PolygonTest(unittest.TestCase):
+
+    def test_array_matches_scalar(self):
+
+        # the vectorized contour has the same points as the contour
+        # computed one Location at a time, also on paths with repeated
+        # Locations
+
+        rng = random.Random(0)
+        paths = read_paths()
+        for k in range(50):
+            locations = [Location(47.26, 11.35, 2000)]
+            for i in range(rng.randint(1, 30)):
+                if rng.random() < 0.2:
+                    loc = locations[-1]
+                    locations.append(Location(loc.lat, loc.lon, loc.alt))
+                else:
+                    locations.append(locations[-1].destination(rng.uniform(0, 360),
+                                                               rng.uniform(100, 3000)))
+            paths.append(('random ' + str(k),
+                          Path(locations, [rng.uniform(50, 500) for _ in locations])))
+
+        for name, path in paths:
+            scalar = path.polygon_scalar().locations
+            array = path.polygon_array()
+            self.assertEqual(len(array), len(scalar), msg=name)
+            for i, loc in enumerate(scalar):
+                self.assertAlmostEqual(array.lat[i], loc.lat, delta=1e-9, msg=name)
+                self.assertAlmostEqual(array.lon[i], loc.lon, delta=1e-9, msg=name)
+                self.assertAlmostEqual(array.alt[i], loc.alt, delta=1e-6, msg=name)
+
+    def test_kml_coordinates(self):
+
+        # the coordinates written by write_kml, in several chunks, are
+        # those of the contour
+
+        path = read_path_file(courses[0])
+        points = path.polygon_array()
+        points = LocationArray(*[np.concatenate([c] * 50)
+                                 for c in (points.lat, points.lon, points.alt)])
+        out = io.StringIO()
+        write_kml(out, points, True)
+        kml = out.getvalue()
+        self.assertIn('<extrude>1</extrude>', kml)
+        coordinates = re.search(r'<coordinates>\n(.*)\n\s*</coordinates>', kml, re.S).group(1)
+        rows = [[float(x) for x in line.split(',')] for line in coordinates.split('\n')]
+        self.assertEqual(len(rows), len(points))
+        for i, (lon, lat, alt) in enumerate(rows):
+            self.assertAlmostEqual(lon, points.lon[i], delta=1e-9)
+            self.assertAlmostEqual(lat, points.lat[i], delta=1e-9)
+            self.assertAlmostEqual(alt, feet_to_meters(points.alt[i]), delta=1e-3)
+
+
+class SegmentIndexTest(unittest.TestCase):
+
+    # The grids of SegmentIndex give the same answers as a scan of all
+    # the segments, near the courses (uniform grid) and far from them
+    # (coarse grids).
+
+    def points(self, path, rng, count, max_dist):
+        for _ in range(count):
+            i = rng.randrange(path.length())
+            loc = path.locations[i].interpolate(path.locations[i+1], rng.random())
+            yield loc.destination(rng.uniform(0, 360), rng.uniform(0, max_dist))
+
+    def check(self, name, path, index, points):
+        geom = path.geometry()
+        for loc in points:
+            scan = [geom.segment_dist(i, loc) for i in range(path.length())]
+
+            candidates = index.candidates(loc)
+            for i, (p, d) in enumerate(scan):
+                if geom.max_tol[i] == 0 or d <= geom.max_tol[i]:
+                    self.assertIn(i, candidates, msg=name)
+
+            i, p, d = index.nearest(loc)
+            self.assertAlmostEqual(d, min(d for p, d in scan), delta=1e-6, msg=name)
+            self.assertAlmostEqual(scan[i][1], d, delta=1e-6, msg=name)
+
+    def test_against_scan(self):
+        rng = random.Random(0)
+        for name, path in read_paths():
+            index = path.segment_index()
+            self.check(name, path, index, self.points(path, rng, 100, 2000))
+            self.check(name, path, index, self.points(path, rng, 20, 200000))
+
+    def test_small_cells(self):
+
+        # many coarse grids
+
+        rng = random.Random(1)
+        for name, path in read_paths()[:4]:
+            index = SegmentIndex(path, cell_size=20)
+            self.assertGreaterEqual(len(index.grids), 2)
+            self.check(name, path, index, self.points(path, rng, 50, 2000))
+            self.check(name, path, index, self.points(path, rng, 20, 200000))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,85 @@
+# File: test_recorder.py
+
+# Checks of recorder.py on a recording in a temporary directory:
+#
+#    python3 -m unittest test_recorder     (or python3 -m pytest)
+
+import os
+import tempfile
+import unittest
+
+from FG import Instruments, Controls
+from recorder import *
+import recorder
+
+
+class RecorderTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.dir.name, 'flight.rec')
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def values(self, i):
+        return tuple(float(i * len(record_fields) + k) for k in range(len(record_fields)))
+
+    def test_record(self):
+        instruments = Instruments()
+        instruments.set([95.5, 3000.25, 1100, 47.26, 11.35, 81.5, 4.6, -0.3], 12.5)
+        controls = Controls()
+        controls.elevator = -0.1
+        controls.throttle = 1
+        rec = Recorder(self.path)
+        rec.record(instruments, controls)
+        rec.record(instruments, controls, 13)
+        rec.close()
+        data = read_recording(self.path)
+        self.assertEqual(list(data['time']), [12.5, 13])
+        self.assertEqual(data['lat'][0], 47.26)
+        self.assertEqual(data['alt'][0], 3000.25)
+        self.assertEqual(data['elevator'][1], -0.1)
+        self.assertEqual(data['throttle'][1], 1)
+
+    def test_grow_and_read(self):
+
+        # more records than fit in the initial size of the file, with
+        # arrays taken before the file grows and kept after close
+
+        count = 3 * recorder._grow_size // record.size
+        rec = Recorder(self.path, ring_size=10)
+        arrays = []
+        for i in range(count):
+            rec.append(self.values(i))
+            if i % 5000 == 0:
+                arrays.append(rec.array())
+        self.assertGreater(rec.size, header_size + 2 * recorder._grow_size)
+        self.assertEqual(rec.last(2), [self.values(count - 2), self.values(count - 1)])
+        whole = rec.array()
+        rec.close()
+        with self.assertRaises(ValueError):
+            rec.array()
+
+        self.assertEqual(os.path.getsize(self.path), header_size + count * record.size)
+        data = read_recording(self.path)
+        self.assertEqual(len(data), count)
+        for i in [0, 1, count // 2, count - 1]:
+            self.assertEqual(tuple(data[i]), self.values(i))
+        self.assertTrue((data == whole).all())
+        for array in arrays:
+            self.assertTrue((data[:len(array)] == array).all())
+
+    def test_empty(self):
+        Recorder(self.path).close()
+        self.assertEqual(len(read_recording(self.path)), 0)
+
+    def test_not_a_recording(self):
+        with open(self.path, 'wb') as f:
+            f.write(b'\0' * 100)
+        with self.assertRaises(ValueError):
+            read_recording(self.path)
+
+
+if __name__ == '__main__':
+    unittest.main()
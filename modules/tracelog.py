@@ -0,0 +1,238 @@
+# File: tracelog.py
+
+# Conversion of the text traces printed by the controllers, like
+# LOWI_08_circuit.log:
+#
+#    === Flight plan: LOWI_08_circuit
+#    heading=81.0 roll= 0.3 pitch= 4.6 => rudder= 0.00 elevator= 0.00 aileron= 0.00 throttle= 0.10
+#    ...
+#
+# to columns of numbers, one .npy file per field, that can be loaded
+# in an instant (and memory mapped) for analysis:
+#
+#    python3 tracelog.py LOWI_08_circuit.log        # creates LOWI_08_circuit.trace/
+#
+#    trace = Trace('LOWI_08_circuit.trace')
+#    trace['roll'], trace.window(10, 20)['elevator'], trace.phase('Flight plan')['t']
+#
+# The fields are those of the first line with key=value fields. The
+# lines starting with '===' mark the start of a phase of the flight
+# and the other lines are ignored. The traces have no timestamps, so
+# the time column t is the line number times the period of the
+# controller (0.2 s), unless the lines have a t= or time= field. The
+# log is read in blocks so that logs of any size are converted with a
+# constant amount of memory.
+
+import json
+import os
+import re
+import warnings
+
+import numpy as np
+
+_block_size = 1 << 22  # bytes of the log parsed at once
+
+field_re = re.compile(rb'([A-Za-z_][\w-]*)=\s*(\S+)')
+marker_re = re.compile(rb'^=== ?(.*?)\r?$', re.M)
+
+
+# A .npy file written in pieces. Its header has a fixed size so that it
+# can be rewritten with the final length once all the values are
+# written.
+
+npy_header_size = 128
+
+
+class NpyWriter:
+
+    def __init__(self, path, dtype='<f8'):
+        self.file = open(path, 'wb')
+        self.dtype = np.dtype(dtype)
+        self.count = 0
+        self.write_header()
+
+    def write_header(self):
+        header = ("{'descr': '" + self.dtype.str + "', 'fortran_order': False, " +
+                  "'shape': (" + str(self.count) + ",), }")
+        header = header.ljust(npy_header_size - 10 - 1) + '\n'
+        self.file.seek(0)
+        self.file.write(b'\x93NUMPY\x01\x00' + len(header).to_bytes(2, 'little') +
+                        header.encode('latin1'))
+
+    def append(self, values):
+        self.file.write(np.ascontiguousarray(values, dtype=self.dtype).tobytes())
+        self.count += len(values)
+
+    def close(self):
+        self.write_header()
+        self.file.close()
+
+
+def line_re(fields):
+
+    # Regular expression that matches a line with these fields, in
+    # this order, and captures their values.
+
+    return re.compile(rb'^[^\n=]*' +
+                      rb'[^\n]*?'.join(re.escape(f) + rb'=\s*(\S+)' for f in fields) +
+                      rb'[^\n]*$', re.M)
+
+
+def parse(part, fields, pattern):
+
+    # Returns the array of the values of the lines of part (one row per
+    # line). When all the lines have the fields the keys are removed and
+    # the numbers are parsed by numpy in one go, otherwise the lines
+    # with the fields are found by the pattern.
+
+    lines = part.count(b'\n') + (not part.endswith(b'\n'))
+    text = part
+    for k in fields:
+        text = text.replace(k + b'=', b' ')
+    text = text.replace(b'=>', b' ')
+    try:
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore')  # text that is not a number ends the parse
+            values = np.fromstring(text, sep=' ')
+        if len(values) == lines * len(fields):
+            return values.reshape(lines, len(fields))
+    except ValueError:
+        pass
+
+    rows = pattern.findall(part)
+    if len(fields) == 1:
+        rows = [(r,) for r in rows]
+    return np.array(rows, dtype=bytes).astype(np.float64).reshape(len(rows), len(fields))
+
+
+def convert(log, out, period=0.2):
+
+    # Converts the log file to a directory out of columns and returns
+    # the number of samples.
+
+    os.makedirs(out, exist_ok=True)
+    fields = None
+    pattern = None
+    writers = None
+    phases = []
+    count = 0
+    rest = b''
+
+    with open(log, 'rb') as f:
+        while True:
+            block = f.read(_block_size)
+            end = len(block) == 0
+            block = rest + block
+            if not end:
+                cut = block.rfind(b'\n') + 1
+                block, rest = block[:cut], block[cut:]
+
+            if fields is None:
+                for line in block.split(b'\n'):
+                    if not line.startswith(b'===') and b'=' in line:
+                        fields = [k for k, v in field_re.findall(line)]
+                        break
+                if fields is not None:
+                    pattern = line_re(fields)
+                    writers = {k.decode(): NpyWriter(os.path.join(out, k.decode() + '.npy'))
+                               for k in fields}
+                    if 't' not in writers and 'time' not in writers:
+                        writers['t'] = NpyWriter(os.path.join(out, 't.npy'))
+
+            # parse the parts of the block between the phase markers
+
+            start = 0
+            for m in list(marker_re.finditer(block)) + [None]:
+                part = block[start:len(block) if m is None else m.start()]
+                if pattern is not None and part:
+                    values = parse(part, fields, pattern)
+                    for i, k in enumerate(fields):
+                        writers[k.decode()].append(values[:, i])
+                    if b't' not in fields and b'time' not in fields:
+                        writers['t'].append(period * np.arange(count, count + len(values)))
+                    count += len(values)
+                if m is not None:
+                    phases.append([m.group(1).decode(errors='replace'), count])
+                    start = m.end() + 1  # after the end of the line
+
+            if end:
+                break
+
+    if writers is not None:
+        for w in writers.values():
+            w.close()
+
+    with open(os.path.join(out, 'trace.json'), 'w') as f:
+        json.dump({'log': os.path.basename(log), 'period': period, 'count': count,
+                   'columns': [] if writers is None else list(writers),
+                   'phases': phases}, f, indent=1)
+
+    return count
+
+
+class Trace:
+
+    # A converted trace. The columns are memory mapped and the queries
+    # return dicts of views on the columns (nothing is copied).
+
+    def __init__(self, path):
+        with open(os.path.join(path, 'trace.json')) as f:
+            info = json.load(f)
+        self.count = info['count']
+        self.period = info['period']
+        self.phases = info['phases']  # list of [name, index of first sample]
+        self.columns = {}
+        for name in info['columns']:
+            self.columns[name] = np.load(os.path.join(path, name + '.npy'), mmap_mode='r')
+        self.t = self.columns.get('t', self.columns.get('time'))
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, column):
+        return self.columns[column]
+
+    def slice(self, start, stop):
+        return {name: col[start:stop] for name, col in self.columns.items()}
+
+    def window(self, t0, t1):
+
+        # Samples with t0 <= t < t1.
+
+        return self.slice(int(np.searchsorted(self.t, t0)), int(np.searchsorted(self.t, t1)))
+
+    def phase(self, name):
+
+        # Samples of the first phase whose name contains name.
+
+        for i, (phase, start) in enumerate(self.phases):
+            if name in phase:
+                stop = self.phases[i+1][1] if i+1 < len(self.phases) else self.count
+                return self.slice(start, stop)
+        raise KeyError(name)
+
+
+def cli():
+
+    import argparse
+    import time
+
+    parser = argparse.ArgumentParser(
+                prog = 'tracelog',
+                description = 'Converts controller trace logs to columns of numbers (.npy files).')
+    parser.add_argument('--period', type=float, default=0.2,
+                        help='seconds between the lines of the log (default: %(default)s)')
+    parser.add_argument('-o', '--out', help='output directory (default: LOG.trace)')
+    parser.add_argument('files', nargs='+')
+    args = parser.parse_args()
+
+    for file in args.files:
+        out = args.out or os.path.splitext(file)[0] + '.trace'
+        start = time.time()
+        count = convert(file, out, args.period)
+        print(file + ': ' + str(count) + ' samples in ' + out +
+              ' (' + format(time.time() - start, '.2f') + 's)')
+
+
+if __name__ == '__main__':
+    cli()
@@ -0,0 +1,402 @@
+# File: bench.py
+
+# Benchmarks of the radar server. They run without FlightGear or a
+# web browser by feeding the radar module with simulated data.
+#
+#    python3 bench.py scoring --planes 100
+
+import argparse
+import http.server
+import json
+import os
+import random
+import re
+import socket
+import threading
+import time
+
+import radar
+from geodetic import *
+
+
+def course_file(name):
+    return os.path.join(os.path.dirname(__file__), "..", "parcours", name, name + ".csv")
+
+
+def report(name, times, budget=None):
+    times = sorted(times)
+    avg = sum(times) / len(times)
+    line = (name + ": avg=" + format(avg * 1000, ".4f") + "ms" +
+            " p99=" + format(times[int(len(times) * 0.99)] * 1000, ".4f") + "ms" +
+            " max=" + format(times[-1] * 1000, ".4f") + "ms")
+    if budget is not None:
+        line += " (" + format(100 * times[-1] / budget, ".1f") + "% of " + str(budget) + "s)"
+        over = [t for t in times if t > budget]
+        line += ("\n  " + str(len(over)) + " of " + str(len(times)) + " over " + str(budget) + "s")
+        if over:
+            line += " by " + format(1000 * (sum(over) / len(over) - budget), ".1f") + "ms on average"
+    print(line)
+
+
+def bench_scoring(args):
+
+    # Scores args.planes planes flying the course at about 100 knots
+    # with some noise, and times update_flights() on every tick. A
+    # fifth of the planes fly off course to exercise the off-course
+    # scoring too.
+
+    radar.set_flight_path(read_path_file(course_file(args.course)))
+    path = radar.flight_path
+    radar.planes.clear()
+    radar.flights.clear()
+
+    random.seed(0)
+    step = 170 * radar.update_period / (path.distance() / path.length())
+    progress = [random.uniform(0, path.length()) for _ in range(args.planes)]
+    noise = [300 if i % 5 == 0 else 20 for i in range(args.planes)]
+
+    times = []
+
+    for _ in range(args.ticks):
+        for i in range(args.planes):
+            progress[i] = (progress[i] + step) % path.length()
+            loc = path.interpolate(progress[i]).destination(random.uniform(0, 360),
+                                                             random.uniform(0, noise[i]))
+            radar.planes["plane" + str(i)] = (loc.lat, loc.lon, loc.alt)
+        start = time.perf_counter()
+        radar.update_flights()
+        times.append(time.perf_counter() - start)
+
+    report("scoring " + str(args.planes) + " planes on " + args.course,
+           times, radar.update_period)
+
+
+# A stand-in for the web server of FlightGear that answers
+# /json/position like a real simulator.
+
+def leaf(name, value, type):
+    return {"path": "/position/" + name, "name": name, "value": value,
+            "type": type, "index": 0, "nChildren": 0}
+
+
+position_json = json.dumps({
+    "path": "/position", "name": "position", "index": 0, "nChildren": 10,
+    "children": [
+        leaf("longitude-deg", 11.330978, "double"),
+        leaf("latitude-deg", 47.258834, "double"),
+        leaf("altitude-ft", 1917.499784, "double"),
+        leaf("altitude-agl-ft", 4.048276, "double"),
+        leaf("ground-elev-m", 583.103422, "double"),
+        leaf("latitude-string", "47*15'31.8\"N", "string"),
+        leaf("longitude-string", "11*19'51.5\"E", "string"),
+        leaf("ground-elev-ft", 1913.06897, "double"),
+        leaf("altitude-agl-m", 1.233915, "double"),
+        leaf("sea-level-radius-ft", 20887949.744455, "double"),
+    ]}, indent=2).encode("utf-8")
+
+
+class FakeSim(http.server.BaseHTTPRequestHandler):
+
+    protocol_version = "HTTP/1.1"  # keep-alive, like FlightGear
+
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(position_json)))
+        self.end_headers()
+        self.wfile.write(position_json)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_fake_sims():
+
+    # Returns the port of a fake sim web server, and the port of a
+    # socket that accepts connections but never answers (a hung sim).
+
+    server = http.server.ThreadingHTTPServer(("0.0.0.0", 0), FakeSim)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    hung = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    hung.bind(("0.0.0.0", 0))
+    hung.listen(1000)
+
+    return server.server_address[1], hung.getsockname()[1]
+
+
+def bench_polling(args):
+
+    # Observes args.sims live sims plus dead and hung ones (a tenth
+    # each) and times the periods of the ticks of periodic_update.
+
+    port, hung_port = start_fake_sims()
+
+    radar.debug = False
+    radar.flight_path = None
+    radar.default_sims = []
+    radar.init_observed_sims()
+    radar.observed_mpservers = {}
+    radar.planes.clear()
+
+    def address(i, port):
+        return "127.0." + str(i // 250) + "." + str(1 + i % 250) + ":" + str(port)
+
+    for i in range(args.sims):
+        radar.observe_sim(address(i, port))
+    for i in range(args.sims // 10):
+        radar.observe_sim(address(i, 1))  # nothing listens on port 1
+        radar.observe_sim(address(i, hung_port))
+
+    times = []
+    start = time.perf_counter()
+    tick = time.time()
+
+    for _ in range(args.ticks):
+        radar.poll(tick + radar.poll_deadline)
+        radar.update_flights()
+        tick += radar.update_period
+        now = time.time()
+        if tick < now:
+            tick = now
+        time.sleep(tick - now)
+        end = time.perf_counter()
+        times.append(end - start)
+        start = end
+
+    report("polling " + str(args.sims) + " sims (" + str(len(radar.planes)) +
+           " answering)", times[1:], radar.update_period)
+
+    sims = radar.get_sims()
+    live = [sims[a] for a in sims if a.endswith(":" + str(port))]
+    connects = sum(s.get("connects", 0) for s in live)
+    connect_times = [s["connect_time"] for s in live if s.get("connect_time") is not None]
+    request_times = [s["request_time"] for s in live if s.get("request_time") is not None]
+    print("  " + str(connects) + " connections opened for " + str(len(live)) + " live sims")
+    if connect_times and request_times:
+        print("  avg connect=" + format(1000 * sum(connect_times) / len(connect_times), ".3f") + "ms" +
+              " avg request=" + format(1000 * sum(request_times) / len(request_times), ".3f") + "ms")
+
+
+def bench_decode(args):
+
+    # Compares the decoding of a /json/position response by a full
+    # parse with extract and by decode_position.
+
+    n = args.ticks * 100
+
+    def full():
+        return radar.extract(json.loads(position_json))
+
+    def fast():
+        return radar.decode_position(position_json)
+
+    for name, decode in [("json.loads + extract", full), ("decode_position", fast)]:
+        assert decode()["latitude-deg"] == 47.258834
+        times = []
+        for _ in range(n):
+            start = time.perf_counter()
+            decode()
+            times.append(time.perf_counter() - start)
+        report("decode " + name, times)
+
+
+def start_fake_mpserver(pilots):
+
+    # Returns the port of a fake mpserver that sends a listing of
+    # pilots spread around the world, a tenth of them near Innsbruck,
+    # in small chunks so that lines are split between reads.
+
+    random.seed(0)
+    lines = ["# " + str(pilots) + " pilots online"]
+    for i in range(pilots):
+        if i % 10 == 0:
+            lat = 47.26 + random.uniform(-1, 1)
+            lon = 11.33 + random.uniform(-1, 1)
+        else:
+            lat = random.uniform(-80, 80)
+            lon = random.uniform(-180, 180)
+        lines.append("pilot" + str(i) + "@mpserver01: 4186245.3 818706.0 4667355.2 " +
+                     str(lat) + " " + str(lon) + " " + str(random.uniform(0, 30000)) +
+                     " -1.64 -2.75 0.65 Aircraft/c172p/Models/c172p.xml")
+    listing = ("\n".join(lines) + "\n").encode("utf-8")
+
+    server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    server.bind(("127.0.0.1", 0))
+    server.listen(100)
+
+    def serve():
+        while True:
+            conn, _ = server.accept()
+            with conn:
+                for i in range(0, len(listing), 1000):
+                    conn.sendall(listing[i:i+1000])
+
+    threading.Thread(target=serve, daemon=True).start()
+
+    return server.getsockname()[1], lines[1:]
+
+
+def bench_mpserver(args):
+
+    # Times read_mpserver on a listing of args.pilots pilots and checks
+    # that no pilot near the point of interest is dropped.
+
+    port, lines = start_fake_mpserver(args.pilots)
+    address = "127.0.0.1:" + str(port)
+
+    expected = 0
+    for line in lines:
+        parts = line.split(" ")
+        loc = Location(float(parts[4]), float(parts[5]), float(parts[6]))
+        if radar.point_of_interest.distance(loc) < radar.point_of_interest_range:
+            expected += 1
+
+    times = []
+    for _ in range(args.ticks // 10 + 1):
+        start = time.perf_counter()
+        positions = radar.read_mpserver(address)
+        times.append(time.perf_counter() - start)
+        assert len(positions) == expected
+
+    report("mpserver listing of " + str(args.pilots) + " pilots (" +
+           str(expected) + " near)", times, radar.update_period)
+
+
+def bench_broadcast(args):
+
+    # Times the publication of the state of args.planes planes, a tenth
+    # of them moving on every tick, to args.sims pages that read the
+    # events, and compares the bytes sent with the polling of /state.
+
+    broadcaster = radar.StateBroadcaster()
+    pages = []
+    received = [0]
+
+    def read(page):
+        while True:
+            data = page.recv(65536)
+            if not data:
+                return
+            received[0] += len(data)
+
+    for _ in range(args.sims):
+        server_side, page = socket.socketpair()
+        threading.Thread(target=read, args=(page,), daemon=True).start()
+        pages.append(page)
+        broadcaster.add(server_side)
+
+    random.seed(0)
+    state = {}
+    for i in range(args.planes):
+        state["plane" + str(i)] = {"lat": random.uniform(47, 48), "lon": random.uniform(11, 12),
+                                   "alt": random.uniform(2000, 6000), "elapsed": 0}
+
+    times = []
+    polled = 0
+
+    for tick in range(args.ticks):
+        state = {p: dict(state[p]) for p in state}
+        for i in range(tick % 10, args.planes, 10):
+            state["plane" + str(i)]["lat"] += 0.0001
+        for p in state:
+            state[p]["elapsed"] += radar.update_period
+        start = time.perf_counter()
+        broadcaster.publish(state)
+        times.append(time.perf_counter() - start)
+        polled += args.sims * len(json.dumps(state))
+
+    time.sleep(0.2)
+
+    report("broadcast of " + str(args.planes) + " planes to " + str(args.sims) + " pages",
+           times, radar.update_period)
+    print("  " + str(received[0]) + " bytes sent (" + str(polled) + " by polling /state)")
+
+
+def bench_http(args):
+
+    # Serves /state for args.planes planes to args.viewers pages that
+    # each keep a connection open and poll /state on every tick, all at
+    # the same moment, and times the answers. The threads of the server
+    # are counted at the end.
+
+    random.seed(0)
+    radar.planes.clear()
+    radar.flights.clear()
+    for i in range(args.planes):
+        radar.planes["plane" + str(i)] = (random.uniform(47, 48), random.uniform(11, 12),
+                                          random.uniform(2000, 6000))
+
+    threads = threading.active_count()
+    server = radar.RadarServer(("127.0.0.1", 0), radar.WebServer)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    viewers = [socket.create_connection(server.server_address) for _ in range(args.viewers)]
+    request = b"GET /state HTTP/1.1\r\nHost: radar\r\n\r\n"
+    times = []
+    statuses = {}
+
+    def read_answer(sock, buffer):
+        while b"\r\n\r\n" not in buffer:
+            buffer += sock.recv(65536)
+        head, _, body = buffer.partition(b"\r\n\r\n")
+        status = head.split(b" ", 2)[1].decode()
+        length = int(re.search(rb"Content-Length: (\d+)", head).group(1))
+        while len(body) < length:
+            body += sock.recv(65536)
+        return status, body[length:]
+
+    for _ in range(args.ticks):
+        start = time.perf_counter()
+        for sock in viewers:
+            sock.sendall(request)
+        for i, sock in enumerate(viewers):
+            status, rest = read_answer(sock, b"")
+            times.append(time.perf_counter() - start)
+            statuses[status] = statuses.get(status, 0) + 1
+            if status == "503":  # the server has closed the connection
+                sock.close()
+                viewers[i] = socket.create_connection(server.server_address)
+
+    report("http /state for " + str(args.planes) + " planes to " + str(args.viewers) +
+           " keep-alive viewers", times, radar.update_period)
+    print("  answers " + str(statuses) + ", " + str(threading.active_count() - threads) +
+          " server threads")
+
+    for sock in viewers:
+        sock.close()
+    server.shutdown()
+    server.server_close()
+
+
+benchmarks = {
+    "scoring": bench_scoring,
+    "polling": bench_polling,
+    "decode": bench_decode,
+    "mpserver": bench_mpserver,
+    "broadcast": bench_broadcast,
+    "http": bench_http,
+}
+
+
+def cli():
+
+    parser = argparse.ArgumentParser(
+        prog="bench", description="Benchmarks of the radar server."
+    )
+    parser.add_argument("--planes", type=int, default=60)
+    parser.add_argument("--sims", type=int, default=100)
+    parser.add_argument("--pilots", type=int, default=5000)
+    parser.add_argument("--viewers", type=int, default=200)
+    parser.add_argument("--ticks", type=int, default=100)
+    parser.add_argument("--course", default="LOWI_08_circuit")
+    parser.add_argument("names", nargs="*", default=list(benchmarks))
+    args = parser.parse_args()
+
+    for name in args.names:
+        benchmarks[name](args)
+
+
+if __name__ == "__main__":
+    cli()
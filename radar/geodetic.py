@@ -1,6 +1,12 @@
 # File: geodetic.py
 
 import math
+import array
+
+try:
+    import numpy as np
+except ImportError:  # numpy is only needed by LocationArray
+    np = None
 
 
 def feet_to_meters(x):
@@ -23,6 +29,48 @@ def heading_diff(heading1, heading2):
     return (heading1 - heading2 + 180) % 360 - 180
 
 
+def project_on_segment(lat, lon, alt, sin_lat, cos_lat,
+                       lat0, lon0, alt0, dlat, dlon, dalt, radius):
+
+    # Finds the position on a segment that is the closest to a point
+    # and returns the tuple (pos, dist) where pos is between 0 and 1
+    # and dist is the distance in feet from the point to the Location
+    # at that position. The segment starts at lat0/lon0/alt0 and ends
+    # at lat0+dlat/lon0+dlon/alt0+dalt, and the Locations on it are
+    # interpolated linearly as done by Location.interpolate. The
+    # projection is done in the local tangent plane of the point (east,
+    # north, altitude), and dist is computed like Location.distance.
+
+    # lat, lon, lat0, lon0, dlat, dlon: in radians
+    # alt, alt0, dalt: in feet
+    # sin_lat, cos_lat: sine and cosine of lat
+    # radius: radius of earth in feet
+
+    r = radius + alt
+    ex = r * cos_lat * dlon
+    ny = r * dlat
+    dd = ex*ex + ny*ny + dalt*dalt
+
+    if dd == 0:
+        pos = 0
+    else:
+        pos = (r * cos_lat * (lon-lon0) * ex +
+               r * (lat-lat0) * ny +
+               (alt-alt0) * dalt) / dd
+        pos = max(0, min(1, pos))
+
+    q_lat = lat0 + dlat*pos
+    q_alt = alt0 + dalt*pos
+
+    v = (sin_lat*math.sin(q_lat) +
+         cos_lat*math.cos(q_lat)*math.cos(lon-lon0-dlon*pos))
+
+    r = radius + min(alt, q_alt)
+
+    return (pos, math.sqrt((math.acos(max(-1, min(1, v))) * r)**2 +
+                           (alt - q_alt)**2))
+
+
 # Creates a point on the earth's surface at the supplied latitude,
 # longitude and altitude.
 
@@ -146,6 +194,442 @@ class Location:
                 ' alt=' + repr(self.alt) + '>')
 
 
+# Creates an array of points on the earth's surface. The latitudes,
+# longitudes and altitudes are stored in contiguous float64 numpy
+# arrays and the methods mirror those of Location, but they compute
+# the result for all the points in a single vectorized operation.
+#
+# When the other operand is a Location the result has one element per
+# point of the array (N x 1). When it is a LocationArray of the same
+# length the operation is done element by element, and with
+# outer=True the result is the N x M matrix of all the pairs.
+
+class LocationArray:
+
+    def __init__(self, lat, lon, alt=0):
+
+        # lat: sequence of latitudes in degrees
+        # lon: sequence of longitudes in degrees
+        # alt: sequence of altitudes in feet (or one altitude for all)
+
+        if np is None:
+            raise ImportError('LocationArray requires numpy')
+
+        self.lat = np.ascontiguousarray(lat, dtype=np.float64)
+        self.lon = np.ascontiguousarray(lon, dtype=np.float64)
+        self.alt = np.ascontiguousarray(np.broadcast_to(alt, self.lat.shape),
+                                        dtype=np.float64)
+        self.radius = 20925524.9 # radius of earth in feet
+
+    @classmethod
+    def from_locations(cls, locations):
+
+        # Creates a LocationArray from a sequence of Locations.
+
+        n = len(locations)
+
+        return cls(np.fromiter((loc.lat for loc in locations), np.float64, n),
+                   np.fromiter((loc.lon for loc in locations), np.float64, n),
+                   np.fromiter((loc.alt for loc in locations), np.float64, n))
+
+    def __len__(self):
+        return len(self.lat)
+
+    def __getitem__(self, i):
+
+        # Indexing with an integer returns a Location, slicing or
+        # indexing with an array returns a LocationArray.
+
+        if isinstance(i, (int, np.integer)):
+            return Location(float(self.lat[i]),
+                            float(self.lon[i]),
+                            float(self.alt[i]))
+        else:
+            return LocationArray(self.lat[i], self.lon[i], self.alt[i])
+
+    def locations(self):
+
+        # Returns the list of Locations of the array.
+
+        return [Location(lat, lon, alt)
+                for lat, lon, alt in zip(self.lat.tolist(),
+                                         self.lon.tolist(),
+                                         self.alt.tolist())]
+
+    def _operands(self, other, outer):
+
+        # Returns the coordinates of this array and of the other
+        # Location or LocationArray, shaped so that they broadcast
+        # to the shape of the result.
+
+        lat1, lon1, alt1 = self.lat, self.lon, self.alt
+        lat2, lon2, alt2 = other.lat, other.lon, other.alt
+
+        if outer:
+            lat1 = lat1[:, None]
+            lon1 = lon1[:, None]
+            alt1 = alt1[:, None]
+
+        return lat1, lon1, alt1, lat2, lon2, alt2
+
+    def distance(self, other, outer=False):
+
+        # Returns the distances in feet from the points of this array
+        # to the other point(s). Same formula as Location.distance.
+
+        # other: the Location or LocationArray to compute distance with
+        # outer: compute the distance of all the pairs of points
+
+        lat1, lon1, alt1, lat2, lon2, alt2 = self._operands(other, outer)
+
+        lat1 = deg2rad(lat1)
+        lon1 = deg2rad(lon1)
+        lat2 = deg2rad(lat2)
+        lon2 = deg2rad(lon2)
+
+        v = (np.sin(lat1)*np.sin(lat2) +
+             np.cos(lat1)*np.cos(lat2)*np.cos(lon1-lon2))
+
+        r = self.radius + np.minimum(alt1, alt2)
+
+        return np.sqrt((np.arccos(np.clip(v, -1, 1)) * r)**2 +
+                       (alt1 - alt2)**2)
+
+    def distance_haversine(self, other, outer=False):
+
+        # Returns the distances in feet from the points of this array
+        # to the other point(s) using the Haversine formula.
+
+        # other: the Location or LocationArray to compute distance with
+        # outer: compute the distance of all the pairs of points
+
+        lat1, lon1, alt1, lat2, lon2, alt2 = self._operands(other, outer)
+
+        phi1 = deg2rad(lat1)
+        lambda1 = deg2rad(lon1)
+        phi2 = deg2rad(lat2)
+        lambda2 = deg2rad(lon2)
+        deltaphi = phi2 - phi1
+        deltalambda = lambda2 - lambda1
+
+        a = np.sin(deltaphi/2) * np.sin(deltaphi/2) + \
+            np.cos(phi1) * np.cos(phi2) * \
+            np.sin(deltalambda/2) * np.sin(deltalambda/2)
+
+        c = 2 * np.arctan2(np.sqrt(a), np.sqrt(1-a))
+
+        r = self.radius + np.minimum(alt1, alt2)
+
+        return np.sqrt((c * r)**2 + (alt1 - alt2)**2)
+
+    def bearing(self, other, outer=False):
+
+        # Returns the bearings in degrees (0 to 360) from the points
+        # of this array to the other point(s).
+
+        # other: the Location or LocationArray to compute bearing to
+        # outer: compute the bearing of all the pairs of points
+
+        lat1, lon1, _, lat2, lon2, _ = self._operands(other, outer)
+
+        phi1 = deg2rad(lat1)
+        phi2 = deg2rad(lat2)
+        deltalambda = deg2rad(lon2 - lon1)
+
+        y = np.sin(deltalambda) * np.cos(phi2)
+        x = (np.cos(phi1)*np.sin(phi2) -
+             np.sin(phi1)*np.cos(phi2)*np.cos(deltalambda))
+        theta = np.arctan2(y, x)
+
+        return rad2deg(theta) % 360
+
+    def destination(self, bearing, dist):
+
+        # Returns the points (LocationArray) at a certain bearing and
+        # distance from the points of this array.
+
+        # bearing: the bearing(s) in degrees
+        # dist: the distance(s) in feet
+
+        theta = deg2rad(np.asarray(bearing, dtype=np.float64))
+        d = np.asarray(dist, dtype=np.float64) / self.radius # angular distance in radians
+
+        phi1 = deg2rad(self.lat)
+        lambda1 = deg2rad(self.lon)
+
+        phi2 = (np.arcsin(np.sin(phi1)*np.cos(d) +
+                          np.cos(phi1)*np.sin(d)*np.cos(theta)))
+        lambda2 = (lambda1 +
+                   np.arctan2(np.sin(theta)*np.sin(d)*np.cos(phi1),
+                              np.cos(d)-np.sin(phi1)*np.sin(phi2)))
+        lambda2 = (lambda2+3*math.pi) % (2*math.pi) - math.pi # normalise to -180..+180
+
+        return LocationArray(rad2deg(phi2), rad2deg(lambda2),
+                             np.broadcast_to(self.alt, phi2.shape))
+
+    def interpolate(self, other, pos):
+
+        # Finds the points between the points of this array and the
+        # other point(s) that are the interpolation at position(s)
+        # pos (between 0 and 1).
+
+        pos = np.asarray(pos, dtype=np.float64)
+
+        return LocationArray(self.lat + (other.lat-self.lat)*pos,
+                             self.lon + (other.lon-self.lon)*pos,
+                             self.alt + (other.alt-self.alt)*pos)
+
+    def __repr__(self):
+        return '<LocationArray len=' + repr(len(self)) + '>'
+
+
+# Precomputed geometry of the segments of a Path. The Locations of a
+# Path do not change once it is created, so what the segment distance
+# computations need is computed once and stored in compact arrays.
+
+class PathGeometry:
+
+    def __init__(self, path):
+
+        # path: the Path whose segments are described
+
+        locations = path.locations
+        tolerances = path.tolerances
+        n = path.length()
+
+        self.lat = array.array('d', [deg2rad(loc.lat) for loc in locations])
+        self.lon = array.array('d', [deg2rad(loc.lon) for loc in locations])
+        self.alt = array.array('d', [loc.alt for loc in locations])
+
+        # per segment: coordinate deltas, length and maximum tolerance
+        # (a maximum tolerance of 0 means the segment has no tolerance)
+
+        self.dlat = array.array('d', [self.lat[i+1]-self.lat[i] for i in range(n)])
+        self.dlon = array.array('d', [self.lon[i+1]-self.lon[i] for i in range(n)])
+        self.dalt = array.array('d', [self.alt[i+1]-self.alt[i] for i in range(n)])
+        self.length = array.array('d', [locations[i].distance(locations[i+1])
+                                        for i in range(n)])
+        self.max_tol = array.array('d', [max(tolerances[i], tolerances[i+1])
+                                         for i in range(n)])
+
+        # per Location: distance along the path from the first Location
+
+        self.cumulative = array.array('d', [0])
+        for d in self.length:
+            self.cumulative.append(self.cumulative[-1] + d)
+
+    def segment_dist(self, i, loc):
+
+        # Same as Path.segment_dist for the i'th segment of the Path.
+
+        lat = deg2rad(loc.lat)
+
+        return project_on_segment(lat, deg2rad(loc.lon), loc.alt,
+                                  math.sin(lat), math.cos(lat),
+                                  self.lat[i], self.lon[i], self.alt[i],
+                                  self.dlat[i], self.dlon[i], self.dalt[i],
+                                  loc.radius)
+
+
+# Uniform grid of square cells used by SegmentIndex. Each cell that
+# is not empty holds the sorted tuple of the indexes of the segments
+# that overlap it.
+
+class SegmentGrid:
+
+    def __init__(self, cell_size, cells):
+
+        # cell_size: size of the cells in feet
+        # cells: dictionary mapping (ix, iy) to tuples of segment indexes
+
+        self.cell_size = cell_size
+        self.cells = cells
+        self.ix_min = min(ix for ix, _ in cells)
+        self.ix_max = max(ix for ix, _ in cells)
+        self.iy_min = min(iy for _, iy in cells)
+        self.iy_max = max(iy for _, iy in cells)
+
+    def cell(self, coord):
+        return math.floor(coord / self.cell_size)
+
+    def ring(self, cx, cy, r):
+
+        # Generates the cells at distance r (in cells) from cell cx/cy,
+        # limited to the extent of the grid.
+
+        x0 = max(cx-r, self.ix_min)
+        x1 = min(cx+r, self.ix_max)
+        y0 = max(cy-r+1, self.iy_min)
+        y1 = min(cy+r-1, self.iy_max)
+
+        for iy in (cy-r, cy+r) if r > 0 else (cy,):
+            if self.iy_min <= iy <= self.iy_max:
+                for ix in range(x0, x1+1):
+                    yield (ix, iy)
+
+        if r > 0:
+            for ix in (cx-r, cx+r):
+                if self.ix_min <= ix <= self.ix_max:
+                    for iy in range(y0, y1+1):
+                        yield (ix, iy)
+
+    def ring_range(self, cx, cy):
+
+        # Returns the first and last distance (in cells) from cell cx/cy
+        # of the rings that overlap the grid.
+
+        return (max(0, self.ix_min-cx, cx-self.ix_max, self.iy_min-cy, cy-self.iy_max),
+                max(cx-self.ix_min, self.ix_max-cx, cy-self.iy_min, self.iy_max-cy))
+
+
+# Spatial index over the segments of a Path. The segments are cut in
+# pieces no longer than the cell size of a uniform grid, and each cell
+# of the grid lists the segments whose pieces, padded by the segment's
+# tolerance, overlap the cell. To find the nearest segment of locations
+# far from the Path, coarser grids are also built (each 8 times coarser
+# than the previous one, until a grid has few cells). The grids are in
+# feet in a plane tangent to the earth at the mean latitude of the Path.
+
+class SegmentIndex:
+
+    def __init__(self, path, cell_size=None):
+
+        # path: the Path to index
+        # cell_size: size of the grid cells in feet (by default it is
+        #            based on the length and tolerance of the segments)
+
+        geom = path.geometry()
+        n = path.length()
+
+        self.path = path
+        self.radius = Location(0, 0).radius
+
+        lat_min = min(geom.lat, default=0)
+        lat_max = max(geom.lat, default=0)
+        self.cos_ref = math.cos((lat_min+lat_max)/2)
+
+        # the east-west scale of the plane is only exact at the mean
+        # latitude, so distances in the plane are off by this factor
+
+        self.scale_err = max(abs(math.cos(lat)/self.cos_ref - 1)
+                             for lat in (lat_min, lat_max))
+
+        if cell_size is None:
+            if n > 0:
+                cell_size = max(sum(geom.length) / n,
+                                2 * sum(geom.max_tol) / n,
+                                50)
+            else:
+                cell_size = 50
+
+        # segments without tolerance contain every location
+
+        self.always = tuple(i for i in range(n) if geom.max_tol[i] == 0)
+
+        self.grids = []
+
+        if n > 0:
+            self.grids.append(self._grid(geom, cell_size, True))
+            while len(self.grids[-1].cells) > 64:
+                cell_size *= 8
+                self.grids.append(self._grid(geom, cell_size, False))
+
+    def _xy(self, lat, lon):
+
+        # lat, lon: in radians
+
+        return (lon * self.cos_ref * self.radius, lat * self.radius)
+
+    def _grid(self, geom, cell_size, padded):
+
+        # Returns the SegmentGrid with the given cell size. When padded
+        # is True the segments are padded by their tolerance and the
+        # segments without tolerance are in every cell.
+
+        cells = {}
+
+        def cell(coord):
+            return math.floor(coord / cell_size)
+
+        for i in range(len(geom.length)):
+            if padded:
+                pad = geom.max_tol[i] * (1 + self.scale_err) + 1
+            else:
+                pad = 0
+            x0, y0 = self._xy(geom.lat[i], geom.lon[i])
+            x1, y1 = self._xy(geom.lat[i+1], geom.lon[i+1])
+            pieces = max(1, math.ceil(math.hypot(x1-x0, y1-y0) / cell_size))
+            for k in range(pieces):
+                ax = x0 + (x1-x0)*k/pieces
+                ay = y0 + (y1-y0)*k/pieces
+                bx = x0 + (x1-x0)*(k+1)/pieces
+                by = y0 + (y1-y0)*(k+1)/pieces
+                for ix in range(cell(min(ax, bx)-pad), cell(max(ax, bx)+pad)+1):
+                    for iy in range(cell(min(ay, by)-pad), cell(max(ay, by)+pad)+1):
+                        cells.setdefault((ix, iy), set()).add(i)
+
+        always = set(self.always) if padded else set()
+
+        return SegmentGrid(cell_size,
+                           {key: tuple(sorted(segms | always))
+                            for key, segms in cells.items()})
+
+    def candidates(self, loc):
+
+        # Returns the sorted tuple of the indexes of the segments whose
+        # tolerance zone may contain loc. The exact distance must still
+        # be checked with the segments' tolerance.
+
+        if not self.grids:
+            return ()
+
+        grid = self.grids[0]
+        x, y = self._xy(deg2rad(loc.lat), deg2rad(loc.lon))
+
+        return grid.cells.get((grid.cell(x), grid.cell(y)), self.always)
+
+    def nearest(self, loc):
+
+        # Returns the tuple (i, pos, dist) for the segment i that is the
+        # closest to loc, pos being the position on that segment and
+        # dist the distance in feet, or None when the Path has no
+        # segments. The cells are searched in rings of increasing size
+        # around loc until no closer segment can be found, moving on to
+        # a coarser grid when too many cells have been visited.
+
+        geom = self.path.geometry()
+        best = None
+        seen = set()
+
+        x, y = self._xy(deg2rad(loc.lat), deg2rad(loc.lon))
+
+        for grid in self.grids:
+            cx = grid.cell(x)
+            cy = grid.cell(y)
+            r, r_max = grid.ring_range(cx, cy)
+            visited = 0
+            while r <= r_max:
+                for key in grid.ring(cx, cy, r):
+                    visited += 1
+                    for i in grid.cells.get(key, ()):
+                        if i not in seen:
+                            seen.add(i)
+                            p, d = geom.segment_dist(i, loc)
+                            if best is None or d < best[2]:
+                                best = (i, p, d)
+                # segments not seen yet are further than r cells
+                if (best is not None and
+                    best[2] <= r * grid.cell_size * (1 - self.scale_err)):
+                    return best
+                if visited >= 128 and grid is not self.grids[-1]:
+                    break
+                r += 1
+            if r > r_max:
+                return best  # all the segments have been seen
+
+        return best
+
+
 # Creates a path, which is a sequence of locations.
 
 class Path:
@@ -159,6 +643,8 @@ class Path:
             self.tolerances = [0] * len(locations)
         else:
             self.tolerances = tolerances
+        self._geometry = None
+        self._segment_index = None
 
     def length(self):
 
@@ -174,23 +660,79 @@ class Path:
 
         return Path(self.locations[i:i+2], self.tolerances[i:i+2])
 
+    def to_array(self):
+
+        # Returns the Locations of the Path as a LocationArray.
+
+        return LocationArray.from_locations(self.locations)
+
+    def geometry(self):
+
+        # Returns the PathGeometry of the Path. It is computed on the
+        # first call so the Path must not be modified afterwards.
+
+        if self._geometry is None:
+            self._geometry = PathGeometry(self)
+
+        return self._geometry
+
+    def segment_index(self):
+
+        # Returns the SegmentIndex of the Path. It is computed on the
+        # first call so the Path must not be modified afterwards.
+
+        if self._segment_index is None:
+            self._segment_index = SegmentIndex(self)
+
+        return self._segment_index
+
+    def nearest_segment(self, loc):
+
+        # Returns the tuple (i, pos, dist) for the segment i of the Path
+        # that is the closest to loc (see SegmentIndex.nearest).
+
+        return self.segment_index().nearest(loc)
+
     def distance(self):
 
         # Returns the distance of the path.
 
-        result = 0
+        return self.geometry().cumulative[-1]
 
-        for i in range(self.length()):
-            result += self.locations[i].distance(self.locations[i+1])
+    def segment_dist(self, loc, exact=True):
 
-        return result
+        # Returns the tuple (pos, dist) where pos (between 0 and 1) is
+        # the position on the first segment of the Path that is the
+        # closest to loc, and dist is the distance in feet to loc.
 
-    def segment_dist(self, loc):
+        # loc: the Location to compute distance with
+        # exact: when True the closest position is computed directly
+        #        by projecting loc on the segment, otherwise it is
+        #        approximated by a bisection search on the segment
+
+        if not exact:
+            return self.segment_dist_bisection(loc)
+
+        loc0 = self.locations[0]
+        loc1 = self.locations[1]
+        lat = deg2rad(loc.lat)
+        lat0 = deg2rad(loc0.lat)
+        lon0 = deg2rad(loc0.lon)
+
+        return project_on_segment(lat, deg2rad(loc.lon), loc.alt,
+                                  math.sin(lat), math.cos(lat),
+                                  lat0, lon0, loc0.alt,
+                                  deg2rad(loc1.lat)-lat0,
+                                  deg2rad(loc1.lon)-lon0,
+                                  loc1.alt-loc0.alt,
+                                  loc.radius)
+
+    def segment_dist_bisection(self, loc):
 
-        levels = math.ceil(math.log(max(4, self.distance()), 2))
-        discretization = (1<<levels) - 2
         loc0 = self.locations[0]
         loc1 = self.locations[1]
+        levels = math.ceil(math.log(max(4, loc0.distance(loc1)), 2))
+        discretization = (1<<levels) - 2
         span = 1<<(levels-2)
         pos_index = (1<<(levels-1)) - 1
 
@@ -224,7 +766,98 @@ class Path:
 
         # Returns a list of the Locations that define the contour
         # of the Path, taking into account the tolerance at each
-        # Location of the Path.
+        # Location of the Path. With numpy the contour is computed
+        # for all the Locations at once (see polygon_array).
+
+        if np is None or self.length() < 1:
+            return self.polygon_scalar()
+
+        return Path(self.polygon_array().locations())
+
+    def polygon_array(self):
+
+        # Returns the contour of the Path (see polygon) as a
+        # LocationArray. The bearings, turns and offsets of all the
+        # Locations are computed with array operations and the offset
+        # points of each side are then laid out in the order in which
+        # polygon_scalar appends them.
+
+        n = self.length()
+        points = self.to_array()
+        lat = points.lat
+        lon = points.lon
+        tol = np.asarray(self.tolerances, dtype=np.float64)
+
+        # bearing from each Location to the next one at a different
+        # position (the last Location keeps the bearing of the one
+        # before it)
+
+        changes = np.flatnonzero((lat[1:] != lat[:-1]) | (lon[1:] != lon[:-1])) + 1
+        changes = np.append(changes, n)
+        nxt = changes[np.searchsorted(changes, np.arange(n), 'right')]
+        bearing = np.empty(n+1)
+        bearing[:n] = points[:n].bearing(points[nxt])
+        bearing[n] = bearing[n-1]
+        prev_bearing = np.empty(n+1)
+        prev_bearing[0] = bearing[0]
+        prev_bearing[1:] = bearing[:-1]
+
+        turn = (bearing - prev_bearing + 180) % 360 - 180  # heading_diff
+        turn[0] = 0  # the ends are not turns
+        turn[n] = 0
+        left = turn > 1  # the arc is on side1
+        right = turn < -1  # the arc is on side2
+        angle = np.where(left, prev_bearing-90, prev_bearing+90)
+        inner = -tol / np.cos(deg2rad(np.clip(turn/2, -60, 60)))
+
+        # the (up to 3) offset points of each Location on each side,
+        # given by their bearing and distance
+
+        arc = np.stack([angle, angle+turn/2, angle+turn], axis=1)
+        zero = np.zeros(n+1)
+
+        b1 = np.stack([bearing-90, zero, zero], axis=1)
+        d1 = np.stack([tol, zero, zero], axis=1)
+        count1 = np.ones(n+1, dtype=np.intp)
+        b2 = np.stack([bearing+90, bearing, zero], axis=1)
+        d2 = np.stack([tol, tol, zero], axis=1)
+        count2 = np.ones(n+1, dtype=np.intp)
+        count2[n] = 2  # the point ahead of the last Location
+
+        b1[left] = arc[left]
+        d1[left] = tol[left, None]
+        count1[left] = 3
+        b2[left, 0] = angle[left] + turn[left]/2
+        d2[left, 0] = inner[left]
+
+        b2[right] = arc[right]
+        d2[right] = tol[right, None]
+        count2[right] = 3
+        b1[right, 0] = angle[right] + turn[right]/2
+        d1[right, 0] = inner[right]
+
+        # side1 starts with the point behind the first Location
+
+        rows1 = np.concatenate([[0], np.arange(n+1)])
+        b1 = np.concatenate([[[bearing[0], 0, 0]], b1])
+        d1 = np.concatenate([[[-tol[0], 0, 0]], d1])
+        count1 = np.concatenate([[1], count1])
+        rows2 = np.arange(n+1)
+
+        use1 = np.arange(3) < count1[:, None]
+        use2 = np.arange(3) < count2[:, None]
+
+        side1 = points[np.repeat(rows1, count1)].destination(b1[use1], d1[use1])
+        side2 = points[np.repeat(rows2, count2)].destination(b2[use2], d2[use2])
+
+        return LocationArray(np.concatenate([side1.lat, side2.lat[::-1], side1.lat[:1]]),
+                             np.concatenate([side1.lon, side2.lon[::-1], side1.lon[:1]]),
+                             np.concatenate([side1.alt, side2.alt[::-1], side1.alt[:1]]))
+
+    def polygon_scalar(self):
+
+        # Computes the contour of the Path (see polygon) one
+        # Location at a time.
 
         n = self.length()
 
@@ -281,15 +914,83 @@ class Path:
 
         # Returns a string that describes the Path in KML format.
 
-        result = ''
+        import io
+
+        out = io.StringIO()
+        self.write_kml(out, extrude_from_ground)
+        return out.getvalue()
+
+    def write_kml(self, file, extrude_from_ground=False):
+
+        # Writes the Path in KML format to the text file object (see
+        # write_kml).
+
+        if np is None:
+            write_kml(file, self.locations, extrude_from_ground)
+        else:
+            write_kml(file, self.to_array(), extrude_from_ground)
+
+
+def format_fixed(values, decimals):
+
+    # Returns the text of the numbers of the array values with the
+    # given number of decimals, as a 2-D array of bytes with one row
+    # per number. The rows have the same width and are padded with
+    # zero bytes (leading zeros and the sign of positive numbers),
+    # which are to be removed once the rows are joined. All the digits
+    # are computed with array operations.
+
+    scale = 10 ** decimals
+    scaled = np.round(np.abs(values) * scale).astype(np.int64)
+    int_digits = len(str(int(scaled.max()) // scale)) if len(scaled) else 1
+    digits = int_digits + decimals
+    d = (scaled[:, None] // 10 ** np.arange(digits-1, -1, -1, dtype=np.int64)) % 10
+
+    text = np.zeros((len(values), digits + 2), dtype=np.uint8)
+    text[:, 0] = np.where((values < 0) & (scaled != 0), ord('-'), 0)
+    text[:, 1:int_digits+1] = d[:, :int_digits] + ord('0')
+    leading = np.cumsum(d[:, :int_digits-1] != 0, axis=1) == 0
+    text[:, 1:int_digits][leading] = 0
+    text[:, int_digits+1] = ord('.')
+    text[:, int_digits+2:] = d[:, int_digits:] + ord('0')
 
-        for i in range(self.length()+1):
-            loc = self.locations[i]
-            result += (str(loc.lon) + ',' +
-                       str(loc.lat) + ',' +
-                       str(feet_to_meters(loc.alt)) + '\n')
+    return text
 
-        return ("""\
+
+def write_kml(file, points, extrude_from_ground=False):
+
+    # Writes the points (a LocationArray, or a list of Locations when
+    # numpy is not available) in KML format to the text file object.
+    # The coordinates are written _kml_chunk points at a time, the
+    # text of each chunk being formatted with array operations (with
+    # 9 decimals for the degrees and 3 for the meters).
+
+    file.write(kml_header + ("""\
+        <extrude>1</extrude>
+""" if extrude_from_ground else "") + kml_coordinates)
+
+    for start in range(0, len(points), _kml_chunk):
+        chunk = points[start:start+_kml_chunk]
+        if np is None:
+            file.write(''.join([str(loc.lon) + ',' +
+                                str(loc.lat) + ',' +
+                                str(feet_to_meters(loc.alt)) + '\n'
+                                for loc in chunk]))
+        else:
+            n = len(chunk)
+            comma = np.full((n, 1), ord(','), dtype=np.uint8)
+            text = np.hstack([format_fixed(chunk.lon, 9), comma,
+                              format_fixed(chunk.lat, 9), comma,
+                              format_fixed(feet_to_meters(chunk.alt), 3),
+                              np.full((n, 1), ord('\n'), dtype=np.uint8)])
+            file.write(text[text != 0].tobytes().decode('ascii'))
+
+    file.write(kml_footer)
+
+
+_kml_chunk = 4096  # points written at once by write_kml
+
+kml_header = """\
 <?xml version="1.0" encoding="UTF-8"?>
 <kml xmlns="http://www.opengis.net/kml/2.2">
   <Document>
@@ -309,21 +1010,23 @@ class Path:
       <description>Flight path</description>
       <styleUrl>#yellowLineGreenPoly</styleUrl>
       <Polygon>
-""" + ("""\
-        <extrude>1</extrude>
-""" if extrude_from_ground else "") + """\
+"""
+
+kml_coordinates = """\
         <altitudeMode>absolute</altitudeMode>
         <outerBoundaryIs>
         <LinearRing>
         <coordinates>
-""" + result + """\
+"""
+
+kml_footer = """\
         </coordinates>
         </LinearRing>
         </outerBoundaryIs>
       </Polygon>
     </Placemark>
   </Document>
-</kml>""")
+</kml>"""
 
 
 def read_path_file(path):
@@ -357,11 +1060,14 @@ def read_path_file(path):
 
 class PathFollower:
 
-    def __init__(self, path):
+    def __init__(self, path, exact=True):
 
         # path: the Path to follow
+        # exact: use the exact projection to compute segment distances
+        #        (see Path.segment_dist)
 
         self.path = path
+        self.exact = exact
         self.min_segm = 0
         self.max_segm = 0
         self.progress = 0
@@ -370,42 +1076,77 @@ class PathFollower:
     def has_stayed_on_path(self):
         return self.min_segm is not None
 
+    def has_reached_destination(self):
+        return self.progress > self.path.length() - 1
+
     def update(self, loc):
 
         path = self.path
-        locations = path.locations
+        geom = path.geometry()
         progress = self.progress
-        dist = 1e400
+        dist = math.inf  # stays inf when no segment is scanned (one Location path)
         min_s = None
         max_s = None
         prev_within_tol = False
 
+        # terms that only depend on loc are computed once for all segments
+
+        lat = deg2rad(loc.lat)
+        lon = deg2rad(loc.lon)
+        alt = loc.alt
+        sin_lat = math.sin(lat)
+        cos_lat = math.cos(lat)
+
+        def segment_dist(i):
+            if self.exact:
+                return project_on_segment(lat, lon, alt, sin_lat, cos_lat,
+                                          geom.lat[i], geom.lon[i], geom.alt[i],
+                                          geom.dlat[i], geom.dlon[i], geom.dalt[i],
+                                          loc.radius)
+            else:
+                return path.segment(i).segment_dist_bisection(loc)
+
         if self.min_segm is None:
-            i = 0
-            limit = path.length()-1
+
+            # The plane has left the path so only the progress and the
+            # distance are updated. The segment index gives the segments
+            # that can contain loc without scanning the whole path.
+
+            index = path.segment_index()
+
+            for i in index.candidates(loc):
+                p, d = segment_dist(i)
+                tol = geom.max_tol[i]
+                if (tol == 0 or d <= tol) and i+p > progress:
+                    progress = i+p
+
+            nearest = index.nearest(loc)
+            if nearest is not None:
+                dist = nearest[2]
+
         else:
+
             i = self.min_segm
             limit = min(path.length()-1, self.max_segm+1)
 
-        while i <= limit:
-            s = path.segment(i)
-            p, d = s.segment_dist(loc)
-            if d < dist: dist = d
-            if ((s.tolerances[0] == 0 and s.tolerances[1] == 0) or
-                d <= max(s.tolerances[0], s.tolerances[1])):
-                # within tolerance
-                if i+p > progress:
-                    progress = i+p
-                if not prev_within_tol:
-                    min_s = i
-                max_s = i
-                prev_within_tol = True
-            else:
-                # not within tolerance
-                if self.max_segm is not None and i > self.max_segm:
-                    break
-                prev_within_tol = False
-            i += 1
+            while i <= limit:
+                p, d = segment_dist(i)
+                if d < dist: dist = d
+                tol = geom.max_tol[i]
+                if tol == 0 or d <= tol:
+                    # within tolerance
+                    if i+p > progress:
+                        progress = i+p
+                    if not prev_within_tol:
+                        min_s = i
+                    max_s = i
+                    prev_within_tol = True
+                else:
+                    # not within tolerance
+                    if i > self.max_segm:
+                        break
+                    prev_within_tol = False
+                i += 1
 
         if self.min_segm is None:
             min_s = None
@@ -419,26 +1160,51 @@ class PathFollower:
         return min_s is not None
 
 
+def to_kml(file, extrude, kmz=False):
+
+    # Writes the contour of the path of the .csv file to a .kml file
+    # next to it, or to a .kmz file (a zipped .kml) when kmz is True.
+
+    import pathlib
+
+    path = read_path_file(file)
+
+    # with numpy the contour is written without making Locations
+    if np is None:
+        points = path.polygon().locations
+    else:
+        points = path.polygon_array()
+
+    if kmz:
+        import io
+        import zipfile
+        kmz_file = pathlib.Path(file).with_suffix('.kmz')
+        with zipfile.ZipFile(kmz_file, 'w', zipfile.ZIP_DEFLATED) as z:
+            with io.TextIOWrapper(z.open('doc.kml', 'w'), encoding='utf-8') as f:
+                write_kml(f, points, extrude)
+    else:
+        kml_file = pathlib.Path(file).with_suffix('.kml')
+        with open(kml_file, 'w') as f:
+            write_kml(f, points, extrude)
+
+
 def cli():
 
     import argparse
-    import pathlib
 
     parser = argparse.ArgumentParser(
                 prog = 'geodetic',
                 description = 'Geodetic path conversion to KML files for viewing in Google earth.')
     parser.add_argument('--tokml', action='store_true')
     parser.add_argument('--extrude', action='store_true')
+    parser.add_argument('--kmz', action='store_true',
+                        help='write zipped .kmz files instead of .kml files')
     parser.add_argument('files', nargs='*')
     args = parser.parse_args()
 
     if args.tokml:
         for file in args.files:
-            kml = read_path_file(file).polygon().to_kml(args.extrude)
-            kml_file = pathlib.Path(file).with_suffix('.kml')
-            with open(kml_file, 'w') as f:
-                f.write(kml)
-
+            to_kml(file, args.extrude, args.kmz)
 
 if __name__ == '__main__':
     cli()
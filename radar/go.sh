@@ -16,12 +16,6 @@ fi
 source "$VENV/bin/activate"
 
 
-if ! pip show requests > /dev/null 2>&1; then
-    echo "===== installing requests"
-    pip install requests
-fi
-
-
 PATH_FILE="../parcours/LOWI_08_circuit/LOWI_08_circuit.csv"
 
 CMD="${PYTHON3} radar.py $PATH_FILE"
@@ -29,23 +29,6 @@ let planes = {}; // planes being tracked
 let cycle = 0;
 let plane_style_counter = 0;
 
-function Timer() {
-    this.start = new Date();
-    this.stop = false;
-    this.stop_time = 0;
-
-    this.elapsed = function () {
-        if (!this.stop) {
-            this.stop_time = (new Date() - this.start) / 1000;
-        }
-        return this.stop_time;
-    };
-
-    this.stopTimer = function () {
-        this.stop = true;
-    };
-}
-
 //------------------------------------------------------------------------------
 
 // Linear algebra.
@@ -141,13 +124,12 @@ function LocationToXY(loc) {
 
 // Mapping of lat/lon to pixel coordinates on LOWI map.
 
-let flight_path = null;
-let flight_path_polygon = null;
+let flight_path_polygon = null; // pixel coordinates of the contour of the course
 
 //------------------------------------------------------------------------------
 
 
-function draw_path(ctx, path) {
+function draw_path(ctx, polygon) {
 
     ctx.fillStyle = path_fill_color;
     ctx.strokeStyle = path_contour_color;
@@ -155,9 +137,8 @@ function draw_path(ctx, path) {
 
     ctx.beginPath();
 
-    for (let i = 0; i <= path.length(); i++) {
-        let loc = path.locations[i];
-        let p = LocationToXY(loc);
+    for (let i = 0; i < polygon.length; i++) {
+        let p = polygon[i];
         if (i === 0) {
             ctx.moveTo(p.x, p.y);
         } else {
@@ -195,23 +176,15 @@ function start() {
 
     async function image_loaded() {
 
-        let r = await fetch('/flight-path');
-        let t = await r.text();
-        let fp = JSON.parse(t);
-
-        if (fp.length > 0) {
-            let locations = [];
-            let tolerances = [];
+        // The contour of the course is computed by the server, it is
+        // converted to pixel coordinates once here.
 
-            for (let i = 0; i < fp.length; i++) {
-                let loc = fp[i];
-                locations.push(new Location(loc[0], loc[1], loc[2]));
-                tolerances.push(loc[3]);
-            }
-
-            flight_path = new Path(locations, tolerances);
+        let r = await fetch('/flight-polygon');
+        let contour = await r.json();
 
-            flight_path_polygon = flight_path.polygon();
+        if (contour.length > 0) {
+            flight_path_polygon = contour.map(
+                ([lat, lon]) => LocationToXY({ lat: lat, lon: lon }));
         }
 
         scale = Math.max(canvas.width / map_img.width,
@@ -219,10 +192,52 @@ function start() {
 
         redraw();
 
-        async function poll() {
-            let r = await fetch('/state');
-            let t = await r.text();
-            let state = JSON.parse(t);
+        // The state of the planes is pushed by the server on /events:
+        // first the whole state (again after each reconnection, with
+        // full set) and then only the planes that have
+        // changed. The elapsed time of a flight is counted here between
+        // the events. Browsers without EventSource poll /state instead.
+
+        let state = {};
+
+        function receive(planes, removed, full) {
+            let now = Date.now();
+            if (full) state = {}; // the whole state, after a (re)connection
+            for (let a in planes) {
+                state[a] = planes[a];
+                state[a].received = now;
+            }
+            for (let i = 0; i < removed.length; i++) {
+                delete state[removed[i]];
+            }
+        }
+
+        if (window.EventSource !== undefined) {
+            let events = new EventSource('/events');
+            events.onmessage = function (event) {
+                let e = JSON.parse(event.data);
+                receive(e.planes, e.removed, e.full === true);
+            };
+        } else {
+            async function poll() {
+                try {
+                    let r = await fetch('/state');
+                    let t = await r.text();
+                    let planes = JSON.parse(t);
+                    let removed = [];
+                    for (let a in state) {
+                        if (!(a in planes)) removed.push(a);
+                    }
+                    receive(planes, removed);
+                } finally {
+                    setTimeout(poll, 200);
+                }
+            }
+            setTimeout(poll, 0);
+        }
+
+        function update() {
+            let now = Date.now();
             for (let a in state) {
                 let loc = state[a];
                 loc = new Location(loc.lat, loc.lon, loc.alt);
@@ -236,10 +251,9 @@ function start() {
                     curr = {
                         last_comm: 0,
                         trail: [loc],
-                        follower: (flight_path===null) ? null : new PathFollower(flight_path),
                         color: color,
                         style: style,
-                        timer: new Timer(),
+                        elapsed: 0,
                         status: '',
                     };
                 }
@@ -256,8 +270,12 @@ function start() {
                     }
                 }
                 planes[a] = curr;
-                if (curr.follower !== null) {
-                    curr.follower.update(loc);
+
+                // course compliance is computed by the server
+                curr.elapsed = state[a].elapsed || 0;
+                curr.status = state[a].status || '';
+                if (curr.status === '' && state[a].elapsed !== undefined) {
+                    curr.elapsed += (now - state[a].received) / 1000;
                 }
             }
 
@@ -274,10 +292,10 @@ function start() {
             cycle = (cycle + 1) % cycle_length;
 
             redraw();
-            setTimeout(poll, 200);
+            setTimeout(update, 200);
         }
 
-        setTimeout(poll, 0);
+        setTimeout(update, 0);
     }
 
     map_img.onload = image_loaded;
@@ -349,7 +367,7 @@ function start() {
                     ctx.fillText(a, x + 30 * dx + ((dx > 0) ? 0 : -0.6 * len * font_size), y + 30 * dy - font_size * 0.2);
                     let t = Math.floor(loc.alt) + ' ft';
 
-                    let time_info = curr.timer.elapsed().toFixed(0) + 's';
+                    let time_info = curr.elapsed.toFixed(0) + 's';
 
                     if (dx > 0) {
                         t = t + ' / ' + time_info;
@@ -357,21 +375,7 @@ function start() {
                         t = time_info + ' / ' + t;
                     }
 
-                    if (curr.follower && !curr.follower.has_stayed_on_path()) {
-                        if (curr.status === '') {
-                            curr.status = '[OFF-COURSE]';
-                        }
-                    }
-
-                    if (curr.follower && curr.follower.has_reached_destination()) {
-                        if (curr.status === '') {
-                            curr.status = '[COMPLETED]';
-                            console.log(a + ' completed in: ' + curr.timer.elapsed().toFixed(0) + 's');
-                        }
-                    }
-
                     if (curr.status !== '') {
-                        curr.timer.stopTimer();
                         if (dx > 0) {
                             t = t + ' ' + curr.status;
                         } else {
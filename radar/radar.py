@@ -6,17 +6,31 @@ import webbrowser
 import threading
 import time
 import argparse
-import requests
+import http.client
 import os
 import socket
+import math
+import re
+import concurrent.futures
+import collections
+import selectors
+import gzip
+import hashlib
+import mimetypes
+import email.utils
 from geodetic import *
 
 # ------------------------------------------------------------------------------
 
 update_period = 0.2  # rate of refresh of plane locations
 
+poll_workers = 128  # maximum number of sims and mpservers polled at once
+poll_deadline = 0.1  # seconds to wait for the polls of a period
+mpserver_timeout = 2  # seconds allowed for a mpserver to send its listing
+
 # ignore locations that are far from the point of interest
 point_of_interest = Location(47.258888, 11.3317, 1907)  # Innsbruck airport
+point_of_interest_range = 1000000  # distance in feet
 
 default_sims = [
     "localhost:5400",
@@ -28,6 +42,11 @@ default_mpservers = [
 ]
 
 flight_path = None
+flight_polygon = None  # contour of flight_path served on /flight-polygon
+
+# path of the position requested from the web server of the sims, any
+# property subtree containing the position leaves can be used
+sim_position_path = "/json/position"
 
 
 def observe_sim(address):
@@ -74,47 +93,143 @@ def extract(props):
     return result
 
 
-def get_net(address, cmd=None):
+# Fast decoding of the position in the JSON property tree sent by a
+# sim. The leaves that are needed are picked directly from the bytes of
+# the response, which is much cheaper than parsing the whole tree with
+# json.loads and walking it with extract. FlightGear puts the name of a
+# property before its value, and leaves have no nested objects.
 
-    try:
-        parts = address.split(":")
-        if len(parts) == 2:
-            with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
-                s.connect((parts[0], int(parts[1])))
-                if cmd is not None:
-                    s.sendall(cmd.encode("utf-8"))
-                data = s.recv(1024 * 1024)
-                return data.decode("utf-8")
-    except BaseException:
-        pass
+position_names = [
+    "latitude-deg",
+    "longitude-deg",
+    "altitude-ft",
+]
+
+optional_position_names = [
+    "heading-deg",
+    "groundspeed-kt",
+]
+
+position_leaf_re = re.compile(
+    rb'"name"\s*:\s*"(' +
+    b"|".join(name.encode("utf-8") for name in position_names + optional_position_names) +
+    rb')"[^{}]*?"value"\s*:\s*(-?[0-9][0-9.eE+-]*)'
+)
+
+
+def decode_position(body):
+
+    # Returns a dictionary of the position leaves found in body (the
+    # bytes of a JSON property tree). Falls back to a full parse when
+    # a leaf that is needed is not found.
+
+    info = {}
+
+    for m in position_leaf_re.finditer(body):
+        info[m.group(1).decode("utf-8")] = float(m.group(2))
+
+    for name in position_names:
+        if name not in info:
+            return extract(json.loads(body))
+
+    return info
+
+
+def point_of_interest_box():
+
+    # Returns the latitude/longitude box (lat_min, lat_max, lon_min,
+    # lon_max) containing all the points within the range of the point
+    # of interest, with some margin.
 
-    return ""
+    d = 1.01 * rad2deg(point_of_interest_range / point_of_interest.radius)
+    lat = point_of_interest.lat
+    cos_lat = math.cos(deg2rad(min(89, abs(lat) + d)))
+
+    return (lat - d, lat + d,
+            point_of_interest.lon - d / cos_lat,
+            point_of_interest.lon + d / cos_lat)
+
+
+mpserver_buffers = {}  # address -> buffer reused for each read
 
 
 def read_mpserver(address):
 
-    lines = list(filter(lambda line: line[0:1] != "#", get_net(address).split("\n")))
+    # Returns the positions of the planes of the mpserver at address
+    # that are near the point of interest. The listing sent by the
+    # mpserver is read until the end and parsed line by line as it
+    # arrives. This is called by a poller thread, and never twice at
+    # once for an mpserver.
 
-    for line in lines:
-        parts = line.split(" ")
-        if len(parts) > 6:
-            parts[0] = parts[0].replace(":", "").replace("@LOCAL", "")
-            parts = [parts[0]] + list(map(float, parts[1:10]))
+    buf = mpserver_buffers.get(address)
+    if buf is None:
+        buf = bytearray(64 * 1024)
+        mpserver_buffers[address] = buf
 
-            name = parts[0]
-            lat = parts[4]
-            lon = parts[5]
-            alt = parts[6]
-            loc = Location(lat, lon, alt)
+    lat_min, lat_max, lon_min, lon_max = point_of_interest_box()
+    probe = Location(0, 0, 0)  # reused for the exact distance check
+    positions = {}
 
-            if point_of_interest.distance(loc) < 1000000:
-                pos = (lat, lon, alt)
-                planes[name] = pos
+    def parse_line(line):
 
+        # line format: "callsign@server: x y z lat lon alt ox oy oz model"
 
-def read_mpservers():
-    for address in observed_mpservers:
-        read_mpserver(address)
+        if line[:1] == b"#":
+            return
+        parts = line.split(b" ")
+        if len(parts) > 6:
+            try:
+                lat = float(parts[4])
+                lon = float(parts[5])
+                if not (lat_min <= lat <= lat_max and lon_min <= lon <= lon_max):
+                    return
+                alt = float(parts[6])
+            except ValueError:
+                return
+            probe.lat = lat
+            probe.lon = lon
+            probe.alt = alt
+            if point_of_interest.distance(probe) < point_of_interest_range:
+                name = parts[0].decode("utf-8", "replace")
+                name = name.replace(":", "").replace("@LOCAL", "")
+                positions[name] = (lat, lon, alt)
+
+    host, port = address.split(":")
+
+    # the view is released even when the read fails or times out, the
+    # buffer could not be grown by the next read otherwise
+
+    view = memoryview(buf)
+    try:
+        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+            s.settimeout(mpserver_timeout)
+            s.connect((host, int(port)))
+            start = 0  # start of the partial line at the beginning of buf
+            while True:
+                if start == len(buf):
+                    view.release()
+                    buf.extend(bytes(len(buf)))  # line longer than buf
+                    view = memoryview(buf)
+                n = s.recv_into(view[start:])
+                if n == 0:
+                    break
+                end = start + n
+                i = 0
+                while True:
+                    j = buf.find(b"\n", i, end)
+                    if j < 0:
+                        break
+                    parse_line(bytes(view[i:j]).rstrip(b"\r"))
+                    i = j + 1
+                view[0:end-i] = view[i:end]  # move the partial line to the front
+                start = end - i
+
+        if start > 0:
+            parse_line(bytes(view[0:start]).rstrip(b"\r"))
+    finally:
+        view.release()
+
+    return positions
 
 
 # JSON received for get of http://localhost:5400/json/position')
@@ -151,34 +266,233 @@ def delete_plane(address):
         pass
 
 
-def read_sims():
-    observed_sims_copy = observed_sims.copy()
-    for address in observed_sims_copy:
-        info = None
-        status = observed_sims_copy[address]
+# Course compliance of the planes. Each plane has a Flight that is
+# scored against the flight path with the same rules as the radar page
+# used to apply: the follower is updated on every tick, even when the
+# plane has not moved (each update can extend its window of segments
+# by one), a plane that jumps by more than new_flight_jump feet starts
+# a new flight, and the status and elapsed time of a flight are frozen
+# once it goes off course or completes the course.
+
+new_flight_jump = 500  # distance in feet
+
+flights = {}
+
+
+class Flight:
+
+    def __init__(self, pos):
+        self.pos = pos
+        self.loc = Location(pos[0], pos[1], pos[2])
+        self.start = time.time()
+        self.stop = None
+        self.status = ""
+        if flight_path is None:
+            self.follower = None
+        else:
+            self.follower = PathFollower(flight_path)
+
+    def elapsed(self):
+        if self.stop is None:
+            return time.time() - self.start
+        else:
+            return self.stop - self.start
+
+    def update(self, pos):
+        self.pos = pos
+        self.loc = Location(pos[0], pos[1], pos[2])
+        follower = self.follower
+        if follower is not None:
+            follower.update(self.loc)
+            if self.status == "":
+                if not follower.has_stayed_on_path():
+                    self.status = "[OFF-COURSE]"
+                elif follower.has_reached_destination():
+                    self.status = "[COMPLETED]"
+                if self.status != "":
+                    self.stop = time.time()
+                    return True
+        return False
+
+
+def update_flights():
+    planes_copy = planes.copy()
+    for name in planes_copy:
+        pos = planes_copy[name]
+        flight = flights.get(name)
+        if flight is None:
+            flight = Flight(pos)
+        elif (pos != flight.pos and
+              flight.loc.distance(Location(pos[0], pos[1], pos[2])) > new_flight_jump):
+            flight = Flight(pos)
+        flights[name] = flight
+        if flight.update(pos) and flight.status == "[COMPLETED]":
+            print(name + " completed in: " + str(round(flight.elapsed())) + "s")
+    for name in list(flights):
+        if name not in planes_copy:
+            del flights[name]
+
+
+# Keep-alive HTTP connection to the web server of a sim, so that a
+# new TCP connection is not needed for every poll. The connection is
+# reopened transparently when the sim closes it, and the time taken by
+# the last connection and by the last request are recorded.
+
+class SimConnection:
+
+    def __init__(self, address):
+        host, port = address.split(":")
+        self.host = host
+        self.port = int(port)
+        self.conn = None
+        self.connects = 0  # number of connections opened
+        self.connect_time = None  # seconds taken by the last connection
+        self.request_time = None  # seconds taken by the last request
+
+    def connect(self):
+        start = time.time()
+        self.conn = http.client.HTTPConnection(self.host, self.port, timeout=update_period)
         try:
-            r = requests.get("http://" + address + "/json/position", timeout=0.2)
-            if r.status_code == 200:
-                status[0] = 0
-                data = r.json()
-                info = extract(data)
+            self.conn.connect()
         except BaseException:
-            if debug:
-                pass  # print('========== could not get position from ' + address)
-            status[0] += 1
-            if status[0] >= 100:
-                if address not in default_sims:
-                    del observed_sims[address]
-                delete_plane(address)
+            self.close()
+            raise
+        self.connect_time = time.time() - start
+        self.connects += 1
+
+    def close(self):
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
+    def get(self, path):
+
+        # Returns the status and body of the response to a GET of path.
+
+        while True:
+            reused = self.conn is not None
+            if not reused:
+                self.connect()
+            try:
+                start = time.time()
+                self.conn.request("GET", path)
+                r = self.conn.getresponse()
+                body = r.read()
+                self.request_time = time.time() - start
+                if r.will_close:
+                    self.close()
+                return (r.status, body)
+            except BaseException:
+                self.close()
+                if not reused:
+                    raise
+                # the sim may have closed the kept-alive connection, retry
+
+
+sim_connections = {}
+
+
+def read_sim(address):
+
+    # Returns the position information of the sim at address, or None
+    # when its web server does not answer with a position. This is
+    # called by a poller thread, and never twice at once for a sim.
+
+    conn = sim_connections.get(address)
+    if conn is None:
+        conn = SimConnection(address)
+        sim_connections[address] = conn
+
+    status, body = conn.get(sim_position_path)
+    if status == 200:
+        return decode_position(body)
+    return None
+
+
+def sim_polled(address, future):
+    status = observed_sims.get(address)
+    if status is None:
+        return  # no longer observed
+    info = None
+    try:
+        info = future.result()
         if info is not None:
-            update_plane(address, info)
+            status[0] = 0
+    except BaseException:
+        if debug:
+            pass  # print('========== could not get position from ' + address)
+        status[0] += 1
+        if status[0] >= 100:
+            if address not in default_sims:
+                del observed_sims[address]
+                conn = sim_connections.pop(address, None)
+                if conn is not None:
+                    conn.close()
+            delete_plane(address)
+    if info is not None:
+        update_plane(address, info)
+
+
+def mpserver_polled(address, future):
+    try:
+        planes.update(future.result())
+    except BaseException:
+        pass
+
+
+# The sims and mpservers are polled concurrently by a pool of threads
+# so that slow or dead ones do not delay the others. A target is only
+# polled again once its previous poll has completed, and polls that
+# are not completed by the end of a period are handled in a later one.
+
+poller = None
+polls = {}  # (kind, address) -> future of the poll in progress
+
+
+def poll(deadline):
+
+    global poller
+
+    if poller is None:
+        poller = concurrent.futures.ThreadPoolExecutor(max_workers=poll_workers)
+
+    for address in observed_sims.copy():
+        if ("sim", address) not in polls:
+            polls[("sim", address)] = poller.submit(read_sim, address)
+
+    for address in observed_mpservers.copy():
+        if ("mpserver", address) not in polls:
+            polls[("mpserver", address)] = poller.submit(read_mpserver, address)
+
+    concurrent.futures.wait(list(polls.values()), timeout=max(0, deadline - time.time()))
+
+    for key, future in list(polls.items()):
+        if future.done():
+            del polls[key]
+            kind, address = key
+            if kind == "sim":
+                sim_polled(address, future)
+            else:
+                mpserver_polled(address, future)
 
 
 def periodic_update():
+
+    # The ticks are scheduled every update_period from the first one,
+    # so a tick that starts late (the thread woke up late or the
+    # previous tick overran) is made up by a shorter one. The polls of
+    # a tick stop waiting poll_deadline after its scheduled start.
+
+    tick = time.time()
     while True:
-        read_sims()
-        read_mpservers()
-        time.sleep(update_period)
+        poll(tick + poll_deadline)
+        update_flights()
+        broadcaster.publish(get_state())
+        tick += update_period
+        now = time.time()
+        if tick < now:
+            tick = now  # more than a period late, do not run ticks back to back
+        time.sleep(tick - now)
 
 
 def api(request):
@@ -191,9 +505,150 @@ def get_state():
     for p in planes_copy:
         s = planes_copy[p]
         state[p] = {"lat": s[0], "lon": s[1], "alt": s[2]}
+        flight = flights.get(p)
+        if flight is not None:
+            state[p]["elapsed"] = flight.elapsed()
+            state[p]["status"] = flight.status
+            follower = flight.follower
+            if follower is not None:
+                state[p]["progress"] = follower.progress
+                # inf (no segment scanned) is not valid JSON
+                distance = follower.distance
+                state[p]["distance"] = distance if math.isfinite(distance) else None
+                state[p]["on_path"] = follower.has_stayed_on_path()
+                state[p]["completed"] = follower.has_reached_destination()
     return state
 
 
+# Push of the state to the radar pages with Server-Sent Events. On each
+# period the changes of the state since the previous period are encoded
+# once and the same bytes are sent to all the pages connected to
+# /events. A page receives the whole state when it connects or
+# reconnects, marked with "full" so that it forgets the planes that
+# left while it was disconnected. It then receives only the planes
+# that have changed (the elapsed time of a flight is not considered a
+# change because the page keeps counting it) and the names of the
+# planes that are gone.
+
+events_max_backlog = 1 << 20  # bytes of events a page can fall behind before it is dropped
+events_heartbeat = 15  # seconds between events when nothing changes
+
+
+def state_changed(old, new):
+    for key in new:
+        if key != "elapsed" and old.get(key) != new[key]:
+            return True
+    return len(old) != len(new)
+
+
+class EventClient:
+
+    # A page receiving the events. Its socket is non-blocking so that
+    # sending an event never waits for a slow page: what the socket does
+    # not accept is kept and sent on the next periods, and the page is
+    # dropped when more than events_max_backlog bytes are waiting.
+
+    def __init__(self, sock):
+        self.sock = sock
+        self.pending = collections.deque()  # events not yet sent (the first one in part)
+        self.backlog = 0  # bytes in pending
+        sock.setblocking(False)
+
+    def send(self, event=b""):
+
+        # Returns False when the page is gone or too far behind.
+
+        if event:
+            self.pending.append(event)
+            self.backlog += len(event)
+        try:
+            while self.pending:
+                data = self.pending[0]
+                sent = self.sock.send(data)
+                self.backlog -= sent
+                if sent < len(data):
+                    self.pending[0] = data[sent:]
+                    break  # the socket buffer is full
+                self.pending.popleft()
+        except (BlockingIOError, InterruptedError):
+            pass
+        except OSError:
+            return self.close()
+        if self.backlog > events_max_backlog:
+            return self.close()
+        return True
+
+    def close(self):
+        try:
+            self.sock.close()
+        except OSError:
+            pass
+        return False
+
+
+class StateBroadcaster:
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.clients = []
+        self.state = {}
+        self.last_event = time.time()
+
+    def encode(self, planes, removed, full=False):
+
+        # full: planes is the whole state (the page replaces its state
+        #       instead of updating it)
+
+        event = {"planes": planes, "removed": removed}
+        if full:
+            event["full"] = True
+        return ("data: " + json.dumps(event) + "\n\n").encode("utf-8")
+
+    def add(self, sock):
+
+        # sock: socket of a page that has been sent the headers of the
+        #       event stream
+
+        client = EventClient(sock)
+        with self.lock:
+            if client.send(self.encode(self.state, [], True)):
+                self.clients.append(client)
+
+    def publish(self, state):
+        with self.lock:
+            changed = {}
+            for p in state:
+                if p not in self.state or state_changed(self.state[p], state[p]):
+                    changed[p] = state[p]
+            removed = [p for p in self.state if p not in state]
+            self.state = state
+            now = time.time()
+            if changed or removed:
+                event = self.encode(changed, removed)
+            elif now - self.last_event >= events_heartbeat:
+                event = b": heartbeat\n\n"  # lets dead connections be detected
+            else:
+                event = b""  # only send what the slow pages have not received yet
+            if event:
+                self.last_event = now
+            self.clients = [c for c in self.clients if c.send(event)]
+
+
+broadcaster = StateBroadcaster()
+
+
+def get_sims():
+    sims = {}
+    for address, observed in observed_sims.copy().items():
+        sims[address] = {"failures": observed[0]}
+        conn = sim_connections.get(address)
+        if conn is not None:
+            sims[address]["connects"] = conn.connects
+            sims[address]["connect_time"] = conn.connect_time
+            sims[address]["request_time"] = conn.request_time
+    return sims
+
+
 def get_flight_path():
     fp = []
     if flight_path is not None:
@@ -208,31 +663,407 @@ def get_flight_path():
 # ------------------------------------------------------------------------------
 
 
+# Cache of the static files of the radar page (radar.html, radar.js,
+# geodetic.js, the map, ...). A file is read once and kept in memory
+# with its gzip compressed variant and its ETag, and it is read again
+# when its modification time changes (checked at most once per
+# static_check_period seconds). The browsers revalidate the files
+# with If-None-Match/If-Modified-Since and get a 304 answer when they
+# already have the current version.
+
+static_root = os.path.dirname(os.path.abspath(__file__))
+static_check_period = 1  # seconds between checks of the modification time
+static_gzip_types = ("text/", "application/javascript", "application/json",
+                     "image/svg+xml")
+
+
+class StaticFile:
+
+    def __init__(self, path):
+        self.path = path
+        self.checked = time.time()
+        self.load()
+
+    def load(self):
+        stat = os.stat(self.path)
+        with open(self.path, "rb") as f:
+            body = f.read()
+        content_type = mimetypes.guess_type(self.path)[0] or "application/octet-stream"
+        self.set_body(body, content_type, stat.st_mtime_ns)
+
+    def set_body(self, body, content_type, mtime):
+        self.body = body
+        self.content_type = content_type
+        self.etag = '"' + hashlib.sha1(body).hexdigest()[:20] + '"'
+        self.last_modified = email.utils.formatdate(mtime / 1e9, usegmt=True)
+        self.mtime = mtime
+        self.gzip_body = None
+        self.gzip_etag = None
+        if content_type.startswith(static_gzip_types):
+            compressed = gzip.compress(body, 9, mtime=0)
+            if len(compressed) < len(body):
+                self.gzip_body = compressed
+                self.gzip_etag = self.etag[:-1] + '-gzip"'
+
+    def check(self):
+        now = time.time()
+        if now - self.checked >= static_check_period:
+            self.checked = now
+            if os.stat(self.path).st_mtime_ns != self.mtime:
+                self.load()
+
+
+class GeneratedFile(StaticFile):
+
+    # A file of the page computed by the server instead of read from
+    # the disk. It is served like the static files but never reloaded.
+
+    def __init__(self, body, content_type):
+        self.path = None
+        self.checked = time.time()
+        self.set_body(body, content_type, time.time_ns())
+
+    def check(self):
+        pass
+
+
+static_files = {}
+static_lock = threading.Lock()
+
+
+def get_static_file(path):
+
+    # Returns the StaticFile of the url path, or None if there is no
+    # such file.
+
+    path = os.path.normpath(os.path.join(static_root, path.lstrip("/")))
+    if not path.startswith(static_root + os.sep) or not os.path.isfile(path):
+        return None
+    with static_lock:
+        file = static_files.get(path)
+        try:
+            if file is None:
+                file = StaticFile(path)
+                static_files[path] = file
+            else:
+                file.check()
+        except OSError:
+            static_files.pop(path, None)
+            return None
+    return file
+
+
+# The contour of the course (the path widened by its tolerances) is
+# computed once when the course is set, and the pages just draw it. It
+# is served as a JSON list of [lat, lon] from the cache, compressed and
+# with an ETag, like the static files.
+
+
+def set_flight_path(path):
+    global flight_path, flight_polygon
+    # the geometry and segment index of the path are built here so that
+    # the updates of the flights never wait for them
+    path.geometry()
+    path.segment_index()
+    flight_path = path
+    contour = [[round(loc.lat, 7), round(loc.lon, 7)] for loc in path.polygon().locations]
+    flight_polygon = GeneratedFile(
+        json.dumps(contour, separators=(",", ":")).encode("utf-8"), "application/json"
+    )
+
+
+# ------------------------------------------------------------------------------
+
+
+# The HTTP server. The connections are kept alive (HTTP/1.1) and their
+# requests are handled by a bounded pool of threads: a selector loop
+# waits for the idle connections to have a request and gives the
+# connection to the pool, which handles the requests available on it
+# and then gives the connection back to the selector loop. When too
+# many requests are waiting for a thread, or there are too many
+# connections, the server answers 503 and closes the connection instead
+# of queuing more work. Idle connections are closed after
+# http_idle_timeout seconds.
+#
+# The connections of the pages receiving the events are detached from
+# the server, which then leaves them open once the request has been
+# handled, and they are kept by the broadcaster.
+
+http_workers = 16  # threads handling the requests
+http_queue_limit = 1024  # requests waiting for a thread before answering 503
+http_max_connections = 2000  # open connections before answering 503
+http_idle_timeout = 30  # seconds before an idle connection is closed
+http_request_timeout = 10  # seconds allowed to receive a request
+
+http_overloaded = (b"HTTP/1.1 503 Service Unavailable\r\n" +
+                   b"Content-Length: 0\r\nRetry-After: 1\r\nConnection: close\r\n\r\n")
+
+
+class HTTPConnection:
+
+    def __init__(self, server, request, client_address):
+        self.sock = request
+        self.last_active = time.time()
+        request.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)  # headers and body are sent apart
+
+        # the handler is created without handling a request, its
+        # handle_one_request method is called for each request
+        handler = server.RequestHandlerClass.__new__(server.RequestHandlerClass)
+        handler.request = request
+        handler.client_address = client_address
+        handler.server = server
+        handler.setup()
+        self.handler = handler
+
+    def has_input(self):
+
+        # Tells if a request has been (at least partly) received and
+        # can be handled without waiting.
+
+        sock = self.sock
+        try:
+            sock.setblocking(False)
+            return len(self.handler.rfile.peek(1)) > 0
+        except OSError:
+            return False
+        finally:
+            sock.settimeout(self.handler.timeout)
+
+
+class RadarServer(http.server.HTTPServer):
+
+    request_queue_size = 128  # many pages can be (re)loaded at once
+
+    def __init__(self, server_address, RequestHandlerClass, workers=None):
+        super().__init__(server_address, RequestHandlerClass)
+        self.detached = set()
+        self.pool = concurrent.futures.ThreadPoolExecutor(max_workers=workers or http_workers)
+        self.lock = threading.Lock()
+        self.pending = 0  # requests given to the pool and not yet handled
+        self.connections = 0
+        self.returned = []  # connections given back by the pool
+        self.wakeup_recv, self.wakeup_send = socket.socketpair()
+        self.wakeup_recv.setblocking(False)
+        self.selector = None
+        self.running = False
+        self.stopped = threading.Event()
+
+    def detach(self, request):
+        self.detached.add(request)
+
+    def shutdown_request(self, request):
+        if request in self.detached:
+            self.detached.discard(request)
+        else:
+            super().shutdown_request(request)
+
+    def serve_forever(self, poll_interval=0.5):
+        self.running = True
+        self.stopped.clear()
+        selector = self.selector = selectors.DefaultSelector()
+        selector.register(self.socket, selectors.EVENT_READ)
+        selector.register(self.wakeup_recv, selectors.EVENT_READ)
+        try:
+            while self.running:
+                for key, _ in selector.select(timeout=1):
+                    if key.fileobj is self.socket:
+                        self.accept()
+                    elif key.fileobj is self.wakeup_recv:
+                        self.watch_returned()
+                    else:
+                        selector.unregister(key.fileobj)
+                        self.dispatch(key.data)
+                self.close_idle()
+        finally:
+            for key in list(selector.get_map().values()):
+                if key.data is not None:
+                    self.close_connection(key.data)
+            selector.close()
+            self.stopped.set()
+
+    def shutdown(self):
+        self.running = False
+        self.wakeup_send.send(b"x")
+        self.stopped.wait()
+
+    def accept(self):
+        try:
+            request, client_address = self.get_request()
+        except OSError:
+            return
+        if self.connections >= http_max_connections:
+            self.reject(request)
+            return
+        self.connections += 1
+        conn = HTTPConnection(self, request, client_address)
+        self.selector.register(request, selectors.EVENT_READ, conn)
+
+    def reject(self, request):
+        try:
+            request.setblocking(False)
+            request.send(http_overloaded)
+        except OSError:
+            pass
+        request.close()
+
+    def dispatch(self, conn):
+        with self.lock:
+            overloaded = self.pending >= http_queue_limit
+            if not overloaded:
+                self.pending += 1
+        if overloaded:
+            self.connections -= 1
+            conn.handler.finish()
+            self.reject(conn.sock)
+        else:
+            self.pool.submit(self.serve_connection, conn)
+
+    def serve_connection(self, conn):
+
+        # Runs in a thread of the pool. Handles the requests available
+        # on the connection and gives it back to the selector loop.
+
+        keep = False
+        try:
+            while True:
+                conn.handler.handle_one_request()
+                if conn.handler.close_connection or conn.sock in self.detached:
+                    break
+                if not conn.has_input():
+                    keep = True
+                    break
+        except OSError:
+            pass  # the client has gone
+        except BaseException:
+            self.handle_error(conn.sock, conn.handler.client_address)
+        finally:
+            with self.lock:
+                self.pending -= 1
+                conn.last_active = time.time()
+                self.returned.append((conn, keep))
+            self.wakeup_send.send(b"x")
+
+    def watch_returned(self):
+        try:
+            while self.wakeup_recv.recv(4096):
+                pass
+        except BlockingIOError:
+            pass
+        with self.lock:
+            returned = self.returned
+            self.returned = []
+        for conn, keep in returned:
+            if keep:
+                self.selector.register(conn.sock, selectors.EVENT_READ, conn)
+            else:
+                self.close_connection(conn)
+
+    def close_connection(self, conn):
+        self.connections -= 1
+        try:
+            conn.handler.finish()
+        except OSError:
+            pass
+        self.shutdown_request(conn.sock)
+
+    def close_idle(self):
+        limit = time.time() - http_idle_timeout
+        for key in list(self.selector.get_map().values()):
+            conn = key.data
+            if conn is not None and conn.last_active < limit:
+                self.selector.unregister(conn.sock)
+                self.close_connection(conn)
+
+
 class WebServer(http.server.BaseHTTPRequestHandler):
 
+    protocol_version = "HTTP/1.1"  # keep-alive, every answer has a Content-Length
+    timeout = http_request_timeout
+
     def do_GET(self):
 
-        path = self.path
+        path = self.path.split("?")[0]
 
         # print('GET path =', path)
 
         if path == "/":
             path = "/radar.html"
 
-        response = b""
+        if path == "/events":
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Cache-Control", "no-cache")
+            self.end_headers()
+            self.server.detach(self.connection)
+            self.close_connection = True
+            broadcaster.add(self.connection)
+            return
 
         if path == "/state":
-            response = json.dumps(get_state()).encode("utf-8")
+            self.send_json(get_state())
+        elif path == "/sims":
+            self.send_json(get_sims())
         elif path == "/flight-path":
-            response = json.dumps(get_flight_path()).encode("utf-8")
-        elif path != "/favicon.ico" and ".." not in path:
-            response = open(
-                os.path.join(os.path.dirname(__file__), path[1:]), "rb"
-            ).read()
-
-        self.send_response(200)
+            self.send_json(get_flight_path())
+        elif path == "/flight-polygon":
+            if flight_polygon is None:
+                self.send_json([])
+            else:
+                self.send_file(flight_polygon)
+        else:
+            self.send_static(path)
+
+    def send_body(self, status, body, content_type, headers=()):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in headers:
+            self.send_header(name, value)
         self.end_headers()
-        self.wfile.write(response)
+        self.wfile.write(body)
+
+    def send_json(self, obj):
+        self.send_body(200, json.dumps(obj).encode("utf-8"), "application/json")
+
+    def send_static(self, path):
+        file = get_static_file(path)
+        if file is None:
+            self.send_body(404, b"Not found", "text/plain")
+        else:
+            self.send_file(file)
+
+    def send_file(self, file):
+        body = file.body
+        etag = file.etag
+        headers = [("Cache-Control", "no-cache"), ("Last-Modified", file.last_modified)]
+        if file.gzip_body is not None:
+            headers.append(("Vary", "Accept-Encoding"))
+            if "gzip" in self.headers.get("Accept-Encoding", ""):
+                body = file.gzip_body
+                etag = file.gzip_etag
+                headers.append(("Content-Encoding", "gzip"))
+        headers.append(("ETag", etag))
+
+        if self.not_modified(file, etag):
+            self.send_response(304)
+            for name, value in headers:
+                self.send_header(name, value)
+            self.end_headers()
+        else:
+            self.send_body(200, body, file.content_type, headers)
+
+    def not_modified(self, file, etag):
+        if_none_match = self.headers.get("If-None-Match")
+        if if_none_match is not None:
+            return etag in if_none_match or if_none_match.strip() == "*"
+        if_modified_since = self.headers.get("If-Modified-Since")
+        if if_modified_since is not None:
+            try:
+                since = email.utils.parsedate_to_datetime(if_modified_since).timestamp()
+            except (TypeError, ValueError):
+                return False
+            return file.mtime // 1000000000 <= since
+        return False
 
     def do_POST(self):
 
@@ -254,9 +1085,7 @@ class WebServer(http.server.BaseHTTPRequestHandler):
                 # print('POST api request =', request)
                 response = api(request)
 
-        self.send_response(200)
-        self.end_headers()
-        self.wfile.write(response)
+        self.send_body(200, response, "text/plain")
 
     def log_message(self, format, *args):
         pass
@@ -288,7 +1117,7 @@ def main():
     t.start()
     threads.append(t)
 
-    server_thread = http.server.ThreadingHTTPServer(("", port), WebServer)
+    server_thread = RadarServer(("", port), WebServer)
 
     # Start the kill_server thread before starting the server
     t = threading.Thread(target=kill_server, args=(server_thread,), daemon=True)
@@ -308,21 +1137,34 @@ def cli():
 
     import pathlib
 
-    global port, debug, flight_path, default_mpservers
+    global port, debug, default_mpservers, sim_position_path, http_workers
 
     parser = argparse.ArgumentParser(
         prog="radar", description="Shows information on a map."
     )
-    parser.add_argument("--port", default=8000)
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument(
+        "--http-workers",
+        type=int,
+        default=http_workers,
+        help="threads handling the HTTP requests (default: %(default)s)",
+    )
     parser.add_argument("--debug", action="store_true")
     parser.add_argument("--mps", action="store_true")
     parser.add_argument("--mpserver", action="append")
+    parser.add_argument(
+        "--sim-path",
+        default=sim_position_path,
+        help="path of the position requested from the sims (default: %(default)s)",
+    )
     parser.add_argument("files", nargs="*")
     args = parser.parse_args()
 
     port = args.port
     debug = args.debug
     mps = args.mps
+    sim_position_path = args.sim_path
+    http_workers = args.http_workers
 
     if not mps:
         default_mpservers = []
@@ -336,7 +1178,7 @@ def cli():
 
     for file in args.files:
         if pathlib.Path(file).suffix == ".csv":
-            flight_path = read_path_file(file)
+            set_flight_path(read_path_file(file))
         else:
             parts = file.split(":")
             if len(parts) == 2:
@@ -345,7 +1187,7 @@ def cli():
                 file = os.path.join(
                     os.path.dirname(__file__), "..", "parcours", file, file + ".csv"
                 )
-                flight_path = read_path_file(file)
+                set_flight_path(read_path_file(file))
 
     main()
 